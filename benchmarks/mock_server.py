@@ -0,0 +1,137 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from scg_parser import parse_expression, concept_ids, valid_sctid, SCGSyntaxError
+from benchmarks.synthetic import FINDINGS, SITED_FINDINGS, SITES, SEVERITIES
+
+FHIR_PATH = "/fhir"
+SNOWSTORM_PATH = "/snowstorm/snomed-ct"
+SEARCHABLE = FINDINGS + SITED_FINDINGS + SITES + SEVERITIES
+
+
+def validate(code):
+    # Stands in for the server's answer: valid unless the expression is malformed or
+    # refers to one of the ids this mock treats as inactive
+    try:
+        ids = concept_ids(parse_expression(code))
+    except SCGSyntaxError as e:
+        return False, f"Unable to parse expression: {e}"
+    inactive = [concept_id for concept_id in ids if not valid_sctid(concept_id) or int(concept_id) % 97 == 0]
+    if inactive:
+        return False, f"Unknown or inactive concept {inactive[0]}"
+    return True, None
+
+
+def parameters(code):
+    result, message = validate(code)
+    resource = {'resourceType': 'Parameters', 'parameter': [{'name': 'result', 'valueBoolean': result}, {'name': 'code', 'valueCode': code}]}
+    if message:
+        resource['parameter'].append({'name': 'message', 'valueString': message})
+    return resource
+
+
+def concepts(params):
+    term = params.get('term', [''])[0].lower()
+    offset = int(params.get('offset', ['0'])[0])
+    limit = int(params.get('limit', ['50'])[0])
+    matches = [(concept_id, name) for concept_id, name in SEARCHABLE if term in name.lower()]
+    items = [
+        {'conceptId': concept_id, 'active': True, 'fsn': {'term': name}, 'pt': {'term': name}}
+        for concept_id, name in matches[offset:offset + limit]
+    ]
+    return {'items': items, 'total': len(matches), 'limit': limit, 'offset': offset}
+
+
+class MockTerminologyHandler(BaseHTTPRequestHandler):
+    # Answers the handful of Ontoserver and Snowstorm calls TermForge makes, after the
+    # server's configured latency. Responses are shaped like the real ones.
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, body, status=200):
+        time.sleep(self.server.latency)
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/fhir+json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        with self.server.lock:
+            self.server.requests += 1
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        if url.path == f"{FHIR_PATH}/CodeSystem/$validate-code":
+            self.reply(parameters(params.get('code', [''])[0]))
+        elif url.path.startswith(SNOWSTORM_PATH) and url.path.endswith("/concepts"):
+            self.reply(concepts(params))
+        else:
+            self.reply({'resourceType': 'OperationOutcome', 'issue': [{'diagnostics': f"Unknown path {url.path}"}]}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        bundle = json.loads(self.rfile.read(length) or b'{}')
+        if urlsplit(self.path).path != FHIR_PATH or bundle.get('type') != 'batch':
+            self.reply({'resourceType': 'OperationOutcome', 'issue': [{'diagnostics': "Expected a batch Bundle"}]}, 400)
+            return
+        entries = []
+        for entry in bundle.get('entry', []):
+            query = parse_qs(urlsplit(entry['request']['url']).query)
+            entries.append({'resource': parameters(query.get('code', [''])[0]), 'response': {'status': '200 OK'}})
+        self.reply({'resourceType': 'Bundle', 'type': 'batch-response', 'entry': entries})
+
+
+class MockTerminologyServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0):
+        super().__init__(("127.0.0.1", port), MockTerminologyHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    @property
+    def fhir_url(self):
+        return self.base_url + FHIR_PATH
+
+    @property
+    def snowstorm_url(self):
+        return self.base_url + SNOWSTORM_PATH
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name="mock-terminology", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for Ontoserver $validate-code and Snowstorm /concepts")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=20, help="Delay before each response, in milliseconds")
+    args = parser.parse_args(argv)
+    server = MockTerminologyServer(args.port, args.latency / 1000)
+    print(f"Ontoserver: {server.fhir_url}\nSnowstorm: {server.snowstorm_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
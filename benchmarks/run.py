@@ -0,0 +1,286 @@
+# Benchmarks for TermForge's hot paths on synthetic mapping tables. Run from the repo root:
+#
+#   python -m benchmarks.run                      # 10k, 100k and 1M rows, written to benchmarks/results/<revision>.json
+#   python -m benchmarks.run --sizes 10000 --only load sort --compare benchmarks/results/abc1234.json
+#   xvfb-run python -m benchmarks.run             # include the Treeview and Text widget timings on a headless box
+#
+# Validation and search go to a local mock Ontoserver/Snowstorm (benchmarks.mock_server)
+# with --latency ms per request, so results only depend on the code and the machine.
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import edit_journal
+import exporters
+import scg_parser
+import terminology
+import tsv_loader
+from syntax_highlighter import tokenize
+from benchmarks.mock_server import MockTerminologyServer
+from benchmarks.synthetic import dataset, DEFAULT_SEED
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+EXPRESSION_COLUMN = "expression"
+# Benchmarks that would take minutes at the largest sizes only run up to this many rows
+FULL_TREE_LIMIT = 100000
+EXCEL_LIMIT = 100000
+HIGHLIGHT_ROWS = 100000
+HIGHLIGHT_WIDGET_ROWS = 1000
+SCROLL_STEPS = 200
+SEARCH_QUERIES = ["diab", "fract", "heart", "lung", "sev", "pneu"]
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def reset_caches():
+    # Parse and canonical-form memos would otherwise make every run after the first cheaper
+    scg_parser._parse_cached.cache_clear()
+    scg_parser.canonical_form.cache_clear()
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return revision + ("-dirty" if dirty else "")
+
+
+class Suite:
+    # Runs each benchmark `repeat` times and keeps every timing under "name/rows"
+    def __init__(self, repeat, only=None):
+        self.repeat = repeat
+        self.only = only
+        self.results = {}
+
+    def wanted(self, name):
+        return not self.only or any(name.startswith(prefix) for prefix in self.only)
+
+    def measure(self, name, rows, run, setup=None, **details):
+        if not self.wanted(name):
+            return None
+        runs = []
+        result = None
+        for _ in range(self.repeat):
+            state = setup() if setup else None
+            reset_caches()
+            start = time.perf_counter()
+            result = run(state) if setup else run()
+            runs.append(time.perf_counter() - start)
+        self.results[f"{name}/{rows}"] = dict(details, benchmark=name, rows=rows, median=statistics.median(runs), min=min(runs), runs=runs)
+        print(f"{name:<28}{rows:>10,}{statistics.median(runs):>10.3f} s", flush=True)
+        return result
+
+    def skip(self, name, rows, reason):
+        if self.wanted(name):
+            self.results[f"{name}/{rows}"] = {'benchmark': name, 'rows': rows, 'skipped': reason}
+            print(f"{name:<28}{rows:>10,}   skipped: {reason}", flush=True)
+
+
+def open_tk():
+    # The Treeview and Text benchmarks need a display; under CI use xvfb-run
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:
+        return None, str(e)
+    root.geometry("1200x800")
+    return root, None
+
+
+def bench_load(suite, path, rows):
+    df = suite.measure("load/pandas", rows, lambda: tsv_loader.load_tsv_chunked(path))
+    if tsv_loader.pa_csv is not None:
+        suite.measure("load/pyarrow", rows, lambda: tsv_loader.load_tsv_chunked(path, engine='pyarrow'))
+    else:
+        suite.skip("load/pyarrow", rows, "pyarrow not installed")
+    return df if df is not None else tsv_loader.load_tsv_chunked(path)
+
+
+def bench_treeview(suite, root, df, rows):
+    from tkinter import ttk
+    from virtual_table import VirtualTable
+
+    frame = ttk.Frame(root)
+    frame.pack(fill='both', expand=True)
+    scroll_y = ttk.Scrollbar(frame, orient='vertical')
+    tree = ttk.Treeview(frame, show="headings", columns=list(df.columns))
+    tree.pack(fill='both', expand=True)
+    table = VirtualTable(tree, scroll_y)
+
+    def populate():
+        table.load(df, tree["columns"])
+        root.update_idletasks()
+
+    def scroll():
+        for step in range(SCROLL_STEPS):
+            table.scroll_to(step * (len(df) // SCROLL_STEPS))
+        root.update_idletasks()
+
+    suite.measure("treeview/virtual load", rows, populate)
+    suite.measure("treeview/virtual scroll", rows, scroll, steps=SCROLL_STEPS)
+    if rows <= FULL_TREE_LIMIT:
+        table.enabled = False
+        suite.measure("treeview/full load", rows, populate)
+        tree.delete(*tree.get_children())
+    else:
+        suite.skip("treeview/full load", rows, f"over {FULL_TREE_LIMIT:,} rows")
+    frame.destroy()
+
+
+def bench_highlight(suite, root, df, rows):
+    expressions = df[EXPRESSION_COLUMN].astype(str).tolist()
+    sample = expressions[:HIGHLIGHT_ROWS]
+    suite.measure("highlight/tokenize", rows, lambda: [tokenize(text) for text in sample], cells=len(sample))
+    suite.measure("highlight/parse", rows, lambda: [scg_parser.syntax_error(text) for text in expressions])
+    if root is None:
+        return
+    import tkinter as tk
+    from syntax_highlighter import LiveHighlighter
+
+    text_widget = tk.Text(root)
+    highlighter = LiveHighlighter(text_widget)
+    sample = expressions[:HIGHLIGHT_WIDGET_ROWS]
+
+    def highlight():
+        for text in sample:
+            text_widget.delete("1.0", "end")
+            text_widget.insert("end", text)
+            highlighter.highlight_all()
+
+    suite.measure("highlight/widget", rows, highlight, cells=len(sample))
+    text_widget.destroy()
+
+
+def bench_sort(suite, df, rows):
+    for col in (EXPRESSION_COLUMN, "map status"):
+        suite.measure(f"sort/{col}", rows, lambda frame: edit_journal.apply_entry(frame, {'op': 'sort', 'col': col, 'ascending': True}), setup=df.copy)
+
+
+def bench_export(suite, df, rows, out_dir):
+    targets = [("tsv", None), ("csv", "gzip"), ("csv", "zstd"), ("parquet", None), ("feather", None), ("xlsx", None)]
+    for export_format, compression in targets:
+        name = f"export/{export_format}" + (f".{compression}" if compression else "")
+        if not suite.wanted(name):
+            continue
+        if compression == "zstd" and exporters.zstandard is None:
+            suite.skip(name, rows, "zstandard not installed")
+        elif export_format in exporters.COLUMNAR_FORMATS and exporters.pa is None:
+            suite.skip(name, rows, "pyarrow not installed")
+        elif export_format == "xlsx" and (exporters.Workbook is None or rows > EXCEL_LIMIT):
+            suite.skip(name, rows, "openpyxl not installed" if exporters.Workbook is None else f"over {EXCEL_LIMIT:,} rows")
+        else:
+            path = os.path.join(out_dir, f"export_{rows}.{export_format}")
+            suite.measure(name, rows, lambda: exporters.export_frame(df, path, export_format, compression))
+            suite.results[f"{name}/{rows}"]['bytes'] = os.path.getsize(path)
+            os.remove(path)
+
+
+def bench_validation(suite, server, df, rows, limit, workers):
+    codes = terminology.distinct_codes(df[EXPRESSION_COLUMN].iloc[:limit] if limit else df[EXPRESSION_COLUMN])
+    for transport in ("get", "batch"):
+        if not suite.wanted(f"validate/{transport}"):
+            continue
+
+        def validate():
+            validator = terminology.ColumnValidator(server.fhir_url, max_workers=workers, transport=transport)
+            return validator.run(codes)
+
+        before = server.requests
+        suite.measure(f"validate/{transport}", rows, validate, codes=len(codes), validated_rows=min(limit, rows) if limit else rows)
+        suite.results[f"validate/{transport}/{rows}"]['requests'] = (server.requests - before) // suite.repeat
+
+
+def bench_search(suite, server, rows):
+    session = terminology.create_session()
+
+    def search():
+        for query in SEARCH_QUERIES:
+            terminology.search_concepts(session, query, "<404684003", server.snowstorm_url)
+
+    suite.measure("search/snowstorm", rows, search, queries=len(SEARCH_QUERIES))
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    print(f"\n{'benchmark':<40}{'baseline':>10}{'current':>10}{'ratio':>8}")
+    for key, result in results.items():
+        old = baseline.get(key)
+        if 'median' not in result or not old or 'median' not in old:
+            continue
+        print(f"{key:<40}{old['median']:>10.3f}{result['median']:>10.3f}{result['median'] / old['median']:>8.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Time TermForge's hot paths on synthetic data")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--only", nargs="+", help="Only run benchmarks whose name starts with one of these, e.g. load sort")
+    parser.add_argument("--latency", type=float, default=5, help="Mock terminology server delay per request, in milliseconds")
+    parser.add_argument("--validate-rows", type=int, default=20000, help="Validate codes from the first N rows (0 for the whole column)")
+    parser.add_argument("--workers", type=int, default=terminology.DEFAULT_WORKERS)
+    parser.add_argument("--no-ui", action="store_true", help="Skip the Treeview and Text widget benchmarks")
+    parser.add_argument("--output", help="Where to write the JSON results (default benchmarks/results/<revision>.json)")
+    parser.add_argument("--compare", help="Earlier results file to print ratios against")
+    args = parser.parse_args(argv)
+
+    root, ui_error = (None, "disabled with --no-ui") if args.no_ui else open_tk()
+    server = MockTerminologyServer(latency=args.latency / 1000).start()
+    suite = Suite(args.repeat, args.only)
+    try:
+        with tempfile.TemporaryDirectory() as out_dir:
+            for rows in args.sizes:
+                path = dataset(rows, args.seed)
+                df = bench_load(suite, path, rows)
+                if root is not None:
+                    bench_treeview(suite, root, df, rows)
+                else:
+                    suite.skip("treeview", rows, ui_error)
+                bench_highlight(suite, root, df, rows)
+                bench_sort(suite, df, rows)
+                bench_export(suite, df, rows, out_dir)
+                bench_validation(suite, server, df, rows, args.validate_rows, args.workers)
+                bench_search(suite, server, rows)
+    finally:
+        server.stop()
+        if root is not None:
+            root.destroy()
+
+    revision = git_revision()
+    report = {
+        'meta': {
+            'revision': revision,
+            'date': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'latency_ms': args.latency,
+            'workers': args.workers,
+            'ui': root is not None,
+        },
+        'results': suite.results,
+    }
+    output = args.output or os.path.join(REPO_DIR, 'benchmarks', 'results', f"{revision or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+    if args.compare:
+        compare(suite.results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import os
+import random
+from scg_parser import valid_sctid
+
+DEFAULT_SEED = 20240601
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+COLUMNS = ["source code", "source term", "expression", "map status", "notes"]
+
+FINDINGS = [
+    ("73211009", "Diabetes mellitus"), ("44054006", "Diabetes mellitus type 2"), ("46635009", "Diabetes mellitus type 1"),
+    ("22298006", "Myocardial infarction"), ("38341003", "Hypertensive disorder"), ("195967001", "Asthma"),
+    ("233604007", "Pneumonia"), ("13645005", "Chronic obstructive lung disease"), ("84114007", "Heart failure"),
+    ("386661006", "Fever"), ("25064002", "Headache"), ("302866003", "Hypoglycemia"),
+    ("68566005", "Urinary tract infectious disease"), ("40733004", "Infectious disease"),
+]
+SITED_FINDINGS = [("125605004", "Fracture of bone"), ("128045006", "Cellulitis"), ("404684003", "Clinical finding")]
+SITES = [
+    ("71341001", "Bone structure of femur"), ("72696002", "Knee region structure"), ("66019005", "Limb structure"),
+    ("39607008", "Lung structure"), ("80891009", "Heart structure"), ("64033007", "Kidney structure"),
+]
+SIDES = [("7771000", "Left"), ("24028007", "Right")]
+SEVERITIES = [("255604002", "Mild"), ("6736007", "Moderate"), ("24484000", "Severe")]
+PROCEDURE_SITES = SITES + [("66754008", "Appendix structure")]
+STATUSES = ["draft", "reviewed", "approved", "retired"]
+NOTES = ["", "", "", "", "check laterality", "needs review", "imported from legacy map"]
+
+
+def reference(concept, with_term=True):
+    concept_id, term = concept
+    return f"{concept_id} |{term}|" if with_term else concept_id
+
+
+def synthetic_sctid(rng):
+    # A core concept id: item identifier, partition 00, then the Verhoeff check digit
+    stem = f"{rng.randrange(100000, 99999999)}00"
+    return next(stem + digit for digit in "0123456789" if valid_sctid(stem + digit))
+
+
+def attributes_text(pairs, with_terms):
+    return ", ".join(f"{reference(name, with_terms)} = {reference(value, with_terms)}" for name, value in pairs)
+
+
+def expression(rng, local_concepts):
+    # Roughly the mix of a mapping table: mostly single concepts, some post-coordinated,
+    # some variants spelled differently and a few malformed entries
+    roll = rng.random()
+    with_terms = rng.random() > 0.15
+    if roll < 0.35:
+        focus = rng.choice(local_concepts)
+        return reference(focus, with_terms), focus[1]
+    if roll < 0.55:
+        focus = rng.choice(FINDINGS)
+        return reference(focus, with_terms), focus[1]
+    if roll < 0.75:
+        focus = rng.choice(SITED_FINDINGS)
+        pairs = [(("363698007", "Finding site"), rng.choice(SITES)), (("272741003", "Laterality"), rng.choice(SIDES))]
+        if rng.random() < 0.3:
+            pairs.reverse()
+        return f"{reference(focus, with_terms)} : {attributes_text(pairs, with_terms)}", focus[1]
+    if roll < 0.85:
+        focus = rng.choice(FINDINGS)
+        pairs = [(("246112005", "Severity"), rng.choice(SEVERITIES))]
+        return f"{reference(focus, with_terms)} : {{ {attributes_text(pairs, with_terms)} }}", focus[1]
+    if roll < 0.97:
+        pairs = [(("260686004", "Method"), ("129304002", "Excision - action")), (("405813007", "Procedure site - Direct"), rng.choice(PROCEDURE_SITES))]
+        if rng.random() < 0.3:
+            pairs.reverse()
+        text = f"{reference(('71388002', 'Procedure'), with_terms)} : {{ {attributes_text(pairs, with_terms)} }}"
+        return (text.replace(" : ", ":") if rng.random() < 0.2 else text), "Excision"
+    focus = rng.choice(FINDINGS)
+    if rng.random() < 0.5:
+        return f"{focus[0]} |{focus[1]}", focus[1]
+    return f"{focus[0][:-1]}{(int(focus[0][-1]) + 1) % 10} |{focus[1]}|", focus[1]
+
+
+def generate(path, rows, seed=DEFAULT_SEED):
+    # Deterministic for a given (rows, seed), so runs on different commits read the same table
+    rng = random.Random(seed)
+    local_concepts = [(synthetic_sctid(rng), f"Synthetic concept {n}") for n in range(max(100, min(rows // 20, 50000)))]
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        f.write("\t".join(COLUMNS) + "\n")
+        for row in range(rows):
+            text, term = expression(rng, local_concepts)
+            f.write(f"LC{row:07d}\t{term}\t{text}\t{rng.choice(STATUSES)}\t{rng.choice(NOTES)}\n")
+    os.replace(tmp_path, path)
+    return path
+
+
+def dataset(rows, seed=DEFAULT_SEED, data_dir=DATA_DIR):
+    # Path of the synthetic TSV for this size, generating it on first use
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"synthetic_{rows}_{seed}.tsv")
+    if not os.path.exists(path):
+        generate(path, rows, seed)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic SNOMED mapping table")
+    parser.add_argument("output")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    args = parser.parse_args(argv)
+    generate(args.output, args.rows, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+from collections import deque
+from edit_journal import apply_entry
+from lazy_modules import lazy_import
+
+pd = lazy_import('pandas')
+tsv_loader = lazy_import('tsv_loader')
+
+MAX_UNDO = 200
+
+
+class EditHistory:
+    # Table-level undo/redo. Each edit is kept as its journal entry plus the
+    # smallest record that reverses it: the old cell value, the dropped column,
+    # the old values of replaced cells, or the row order before a sort. Redo
+    # re-applies the entry itself, so nothing is ever a full-table snapshot.
+    def __init__(self, limit=MAX_UNDO):
+        self.undo_stack = deque(maxlen=limit)
+        self.redo_stack = []
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def apply(self, df, entry):
+        result = self.push(df, entry)
+        self.redo_stack.clear()
+        return result
+
+    def push(self, df, entry):
+        op = entry['op']
+        if op == 'set':
+            inverse = ('set', df.iat[entry['row'], df.columns.get_loc(entry['col'])])
+        elif op == 'add_column':
+            inverse = ('drop',)
+        elif op == 'delete_column':
+            inverse = ('insert', df.columns.get_loc(entry['name']), df[entry['name']])
+        elif op == 'derive':
+            inverse = ('restore', df[entry['name']]) if entry['name'] in df.columns else ('drop',)
+        elif op == 'sort':
+            # Index labels are unique, so the old index is the permutation to restore
+            inverse = ('order', df.index)
+        else:
+            inverse = None
+
+        result = apply_entry(df, entry)
+        if op == 'replace':
+            old_columns, rows = result
+            inverse = ('cells', rows, {col: old.iloc[rows].to_numpy() for col, old in old_columns.items()})
+        self.undo_stack.append((entry, inverse))
+        return result
+
+    def undo(self, df):
+        # Reverts the last edit in place and returns its entry, or None if there is nothing to undo
+        if not self.undo_stack:
+            return None
+        entry, inverse = self.undo_stack.pop()
+        kind = inverse[0]
+        if kind == 'set':
+            tsv_loader.set_cell(df, entry['row'], df.columns.get_loc(entry['col']), inverse[1])
+        elif kind == 'drop':
+            df.drop(columns=[entry['name']], inplace=True)
+        elif kind == 'insert':
+            df.insert(inverse[1], entry['name'], inverse[2])
+        elif kind == 'restore':
+            df[entry['name']] = inverse[1]
+        elif kind == 'order':
+            previous = inverse[1]
+            df.sort_index(inplace=True, key=lambda index: pd.Index(previous.get_indexer(index)))
+        elif kind == 'cells':
+            for col, values in inverse[2].items():
+                tsv_loader.set_cells(df, inverse[1], df.columns.get_loc(col), values)
+        self.redo_stack.append(entry)
+        return entry
+
+    def redo(self, df):
+        if not self.redo_stack:
+            return None
+        entry = self.redo_stack.pop()
+        self.push(df, entry)
+        return entry
@@ -0,0 +1,203 @@
+import glob
+import hashlib
+import json
+import os
+from terminology_cache import config_dir
+from lazy_modules import lazy_import
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Only needed to apply entries, which never happens before a table is loaded
+tsv_loader = lazy_import('tsv_loader')
+table_search = lazy_import('table_search')
+
+
+JOURNAL_PREFIX = 'edit_journal'
+
+
+def journal_path(base_path, directory=None):
+    # One journal per base file, so windows editing different files never share one
+    digest = hashlib.sha256(os.path.abspath(base_path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(directory or config_dir(), f"{JOURNAL_PREFIX}_{digest}.jsonl")
+
+
+def lock(file):
+    # Takes a non-blocking exclusive lock, held until the file is closed. False when another
+    # window already holds it, i.e. has the same base file open.
+    try:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class EditJournal:
+    # Append-only log of table edits made since the base TSV was last written.
+    # The first line names the base file; every later line is one edit entry,
+    # flushed to disk before the edit is considered done. The open journal is
+    # locked, so a second window on the same file runs without one.
+    def __init__(self, directory=None):
+        self.directory = directory or config_dir()
+        self.path = None
+        self.file = None
+        self.edits = 0
+
+    @property
+    def active(self):
+        return self.file is not None
+
+    def open_locked(self, path):
+        # Opened for appending so nothing is truncated before the lock is held
+        file = open(path, 'a+', encoding='utf-8')
+        if not lock(file):
+            file.close()
+            return False
+        self.path = path
+        self.file = file
+        return True
+
+    def start(self, base_path):
+        # Begins a fresh journal over base_path, dropping any earlier entries.
+        # Journaling is switched off when the config dir is not writable or
+        # another window holds this file's journal.
+        path = journal_path(base_path, self.directory)
+        if self.path is not None and self.path != path:
+            # The journal this window held before (a recovered one, or another file's) is done with
+            self.discard()
+        self.close()
+        self.edits = 0
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if self.open_locked(path):
+                self.file.truncate(0)
+                self.append({'op': 'base', 'path': os.path.abspath(base_path), 'signature': file_signature(base_path)})
+        except OSError:
+            self.close()
+
+    def resume(self, path, edits):
+        # Keeps appending to a recovered journal, after any line torn by the crash
+        self.close()
+        self.edits = edits
+        try:
+            if not self.open_locked(path):
+                return
+            # Checked as bytes: the torn line may end inside a UTF-8 character
+            with open(path, 'rb') as f:
+                size = f.seek(0, os.SEEK_END)
+                f.seek(max(size - 1, 0))
+                last = f.read(1)
+            if last and last != b'\n':
+                self.file.write('\n')
+        except OSError:
+            self.close()
+
+    def record(self, entry):
+        if self.file is None:
+            return
+        self.append(entry)
+        self.edits += 1
+
+    def append(self, entry):
+        self.file.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def discard(self):
+        # Closed first: the lock has to go before the file can be removed on Windows
+        self.close()
+        self.edits = 0
+        if self.path is not None:
+            discard_journal(self.path)
+            self.path = None
+
+
+def discard_journal(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def pending_journal(path):
+    # (base entry, edit entries) left behind by a session that did not finish, or None.
+    # None too while another window holds the journal. A line torn by a crash
+    # mid-write, even inside a UTF-8 character, is skipped.
+    if not os.path.exists(path):
+        return None
+    entries = []
+    with open(path, 'rb') as f:
+        if not lock(f):
+            return None
+        f.seek(0)
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    if len(entries) < 2 or entries[0].get('op') != 'base':
+        return None
+    return entries[0], entries[1:]
+
+
+def pending_journals(directory=None):
+    # [(journal path, base entry, edit entries)], most recently written first
+    paths = glob.glob(os.path.join(directory or config_dir(), f"{JOURNAL_PREFIX}*.jsonl"))
+    found = []
+    for path in sorted(paths, key=os.path.getmtime, reverse=True):
+        pending = pending_journal(path)
+        if pending is not None:
+            found.append((path,) + pending)
+    return found
+
+
+def base_changed(base):
+    # True when the base TSV was modified after the journal started
+    return not os.path.exists(base['path']) or file_signature(base['path']) != base['signature']
+
+
+def apply_entry(df, entry):
+    # Applies one edit to df in place. A replace returns ({column: previous Series}, changed rows).
+    op = entry['op']
+    if op == 'set':
+        tsv_loader.set_cell(df, entry['row'], df.columns.get_loc(entry['col']), entry['value'])
+    elif op == 'add_column':
+        df[entry['name']] = ""
+    elif op == 'delete_column':
+        df.drop(columns=[entry['name']], inplace=True)
+    elif op == 'sort':
+        df.sort_values(by=entry['col'], ascending=entry['ascending'], inplace=True, key=tsv_loader.sort_key)
+    elif op == 'replace':
+        return table_search.replace_in_columns(df, entry['columns'], entry['pattern'], entry['replacement'], entry['regex'], entry['case'])
+    elif op == 'derive':
+        # Status columns are stored as the answer for each distinct source value
+        df[entry['name']] = df[entry['source']].astype(str).str.strip().map(entry['mapping']).fillna(entry['default'])
+    else:
+        raise ValueError(f"Unknown journal entry: {op}")
+
+
+def replay(df, entries, history):
+    # Edits go through the same undo history as live ones so undo/redo entries replay exactly
+    for entry in entries:
+        if entry['op'] == 'undo':
+            history.undo(df)
+        elif entry['op'] == 'redo':
+            history.redo(df)
+        else:
+            history.apply(df, entry)
+    return df
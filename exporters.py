@@ -0,0 +1,196 @@
+import gzip
+import io
+import os
+import sys
+import instrumentation
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    from openpyxl import Workbook
+except ImportError:
+    Workbook = None
+
+# File extension -> export format
+FORMATS = {
+    '.tsv': 'tsv',
+    '.txt': 'tsv',
+    '.csv': 'csv',
+    '.json': 'jsonl',
+    '.jsonl': 'jsonl',
+    '.xlsx': 'xlsx',
+    '.parquet': 'parquet',
+    '.feather': 'feather',
+}
+COMPRESSIONS = {
+    '.gz': 'gzip',
+    '.zst': 'zstd',
+}
+TEXT_FORMATS = ('tsv', 'csv', 'jsonl')
+STREAMING_FORMATS = TEXT_FORMATS
+COLUMNAR_FORMATS = ('parquet', 'feather')
+DEFAULT_CHUNK_ROWS = 50000
+
+
+def format_for_path(path, default='tsv'):
+    return path_format(path, default)[0]
+
+
+def path_format(path, default='tsv'):
+    # 'release.tsv.gz' -> ('tsv', 'gzip')
+    root, ext = os.path.splitext(path.lower())
+    compression = COMPRESSIONS.get(ext)
+    if compression:
+        ext = os.path.splitext(root)[1]
+    return FORMATS.get(ext, default), compression
+
+
+def open_text(path, compression=None):
+    if path == '-':
+        return sys.stdout
+    if compression == 'gzip':
+        return gzip.open(path, 'wt', encoding='utf-8', newline='')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstd output needs the 'zstandard' package")
+        raw = zstandard.ZstdCompressor().stream_writer(open(path, 'wb'), closefd=True)
+        return io.TextIOWrapper(raw, encoding='utf-8', newline='')
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+class ChunkWriter:
+    # Writes a table chunk by chunk so only one chunk is ever held in memory.
+    # A path of '-' writes to stdout.
+    def __init__(self, path, export_format, compression=None):
+        if export_format not in TEXT_FORMATS:
+            raise ValueError(f"{export_format} cannot be written in chunks")
+        self.export_format = export_format
+        self.owns_file = path != '-'
+        self.file = open_text(path, compression)
+        self.header_written = False
+
+    def write(self, chunk):
+        if self.export_format == 'jsonl':
+            text = chunk.to_json(orient='records', lines=True)
+            if text and not text.endswith('\n'):
+                text += '\n'
+            self.file.write(text)
+        else:
+            sep = '\t' if self.export_format == 'tsv' else ','
+            chunk.to_csv(self.file, sep=sep, index=False, header=not self.header_written, lineterminator='\n')
+        self.header_written = True
+
+    def close(self):
+        if self.owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ColumnarWriter:
+    # Parquet row groups or Feather (Arrow IPC) record batches, one per chunk
+    def __init__(self, path, export_format, compression=None):
+        if pa is None:
+            raise RuntimeError(f"{export_format} output needs the 'pyarrow' package")
+        self.path = path
+        self.export_format = export_format
+        self.compression = compression or ('zstd' if export_format == 'parquet' else 'lz4')
+        self.writer = None
+
+    def write(self, chunk):
+        # Object columns can mix numbers and text after edits, which Arrow cannot
+        # type, so they are written as strings
+        text_columns = {col: 'string' for col in chunk.columns if chunk[col].dtype == object}
+        table = pa.Table.from_pandas(chunk.astype(text_columns), preserve_index=False)
+        if self.writer is None:
+            self.schema = table.schema
+            if self.export_format == 'parquet':
+                self.writer = pq.ParquetWriter(self.path, table.schema, compression=self.compression)
+            else:
+                options = pa.ipc.IpcWriteOptions(compression=self.compression)
+                self.writer = pa.ipc.new_file(self.path, table.schema, options=options)
+        elif table.schema != self.schema:
+            table = table.cast(self.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ExcelWriter:
+    # openpyxl's write-only mode appends rows without building the sheet in memory
+    def __init__(self, path, export_format='xlsx', compression=None):
+        if Workbook is None:
+            raise RuntimeError("Excel output needs the 'openpyxl' package")
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet()
+        self.header_written = False
+
+    def write(self, chunk):
+        if not self.header_written:
+            self.sheet.append([str(col) for col in chunk.columns])
+            self.header_written = True
+        for row in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None):
+            self.sheet.append(row)
+
+    def close(self):
+        self.workbook.save(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_writer(path, export_format, compression=None):
+    if export_format in TEXT_FORMATS:
+        return ChunkWriter(path, export_format, compression)
+    if export_format in COLUMNAR_FORMATS:
+        return ColumnarWriter(path, export_format)
+    if export_format == 'xlsx':
+        return ExcelWriter(path)
+    raise ValueError(f"Unknown export format: {export_format}")
+
+
+@instrumentation.timed('export_frame', 'io')
+def export_frame(df, path, export_format, compression=None, chunksize=DEFAULT_CHUNK_ROWS, on_progress=None, cancelled=None):
+    # Writes df chunk by chunk, reporting the fraction done. When cancelled the
+    # partial file is removed and False is returned.
+    total = len(df)
+    with open_writer(path, export_format, compression) as writer:
+        for start in range(0, max(total, 1), chunksize):
+            if cancelled is not None and cancelled.is_set():
+                break
+            writer.write(df.iloc[start:start + chunksize])
+            if on_progress:
+                on_progress(min(start + chunksize, total) / max(total, 1))
+    if cancelled is not None and cancelled.is_set():
+        if path != '-' and os.path.exists(path):
+            os.remove(path)
+        return False
+    return True
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+from scg_parser import canonical_key, expression_hash
+
+
+def stripped_text(series):
+    return series.astype(object).where(series.notna(), "").astype(str).str.strip()
+
+
+class ExpressionIndex:
+    # Maps the hash of each row's canonical expression to the positions of the rows
+    # holding it, for one column. Canonicalization runs once per distinct cell value.
+    def __init__(self, df, column):
+        self.column = column
+        text = stripped_text(df[column])
+        distinct = [value for value in pd.unique(text) if value]
+        hashes = {value: expression_hash(value) for value in distinct}
+        self.keys = {hashes[value]: canonical_key(value) for value in distinct}
+        self.row_hashes = text.map(hashes).to_numpy(dtype=object)
+
+        codes, uniques = pd.factorize(self.row_hashes)
+        present = codes >= 0
+        order = np.flatnonzero(present)[np.argsort(codes[present], kind='stable')]
+        counts = np.bincount(codes[present], minlength=len(uniques))
+        self.positions = dict(zip(uniques, np.split(order, np.cumsum(counts)[:-1])))
+
+    def rows(self, value):
+        # Positions of every row whose expression is equivalent to value
+        return self.positions.get(expression_hash(value.strip()), np.empty(0, dtype=np.intp))
+
+    def update(self, row, value):
+        # Moves one row to the group of its new value after a cell edit
+        old = self.row_hashes[row]
+        if isinstance(old, str):
+            group = self.positions[old]
+            group = group[group != row]
+            if len(group):
+                self.positions[old] = group
+            else:
+                del self.positions[old]
+                del self.keys[old]
+        value = "" if pd.isna(value) else str(value).strip()
+        if not value:
+            self.row_hashes[row] = None
+            return
+        new = expression_hash(value)
+        self.row_hashes[row] = new
+        self.keys.setdefault(new, canonical_key(value))
+        group = self.positions.get(new, np.empty(0, dtype=np.intp))
+        self.positions[new] = np.insert(group, np.searchsorted(group, row), row)
+
+    def duplicates(self):
+        # [(canonical form, positions)] for expressions on more than one row, most repeated first
+        groups = [(self.keys[key], rows) for key, rows in self.positions.items() if len(rows) > 1]
+        return sorted(groups, key=lambda group: -len(group[1]))
+
+    def conflicts(self, df, other):
+        # Duplicate groups whose rows disagree on the other column, e.g. the same
+        # expression mapped to two different source codes
+        values = stripped_text(df[other]).to_numpy(dtype=object)
+        return [(key, rows) for key, rows in self.duplicates() if len(set(values[rows])) > 1]
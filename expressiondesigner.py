@@ -1,12 +1,36 @@
+import time
+STARTED = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext, simpledialog
-import pandas as pd
-import requests
+import argparse
 import json
 import sv_ttk  # Importing the sv_ttk library
 import re
-from urllib.parse import quote
+import os
+import sys
 import threading
+from virtual_table import VirtualTable
+import terminology
+from scg_parser import syntax_error
+from syntax_highlighter import LiveHighlighter
+from snomed_search import SnomedTypeAhead, MIN_QUERY_LENGTH, concept_lines
+from terminology_cache import open_cache
+from rf2_index import build_description_index, open_description_index, default_index_path
+from rf2_closure import ClosureIndex, open_closure_index, scope_answers
+from job_scheduler import JobScheduler, PRIORITY_INTERACTIVE, PRIORITY_BULK
+import edit_journal
+from edit_history import EditHistory
+from lazy_modules import lazy_import
+import instrumentation
+
+# pandas-backed modules load on first use, after the window is already up
+pd = lazy_import('pandas')
+tsv_loader = lazy_import('tsv_loader')
+table_search = lazy_import('table_search')
+exporters = lazy_import('exporters')
+expression_index = lazy_import('expression_index')
+release_diff = lazy_import('release_diff')
 
 left_insert = "272741003 | Laterality (attribute) | = 7771000 | Left (qualifier value) |"
 right_insert = "272741003 | Laterality (attribute) | = 24028007 | Right (qualifier value) |"
@@ -15,57 +39,117 @@ procedure_insert = "405813007 | Procedure site - Direct (attribute) |"
 method_insert = "260686004 | Method (attribute) |"
 contrast_insert = "424361007|Using substance (attribute)| = 385420005|Contrast media (substance)|"
 
-def highlight_snomed_expression(text_widget, expression):
-    # Clear existing tags
-    for tag in text_widget.tag_names():
-        text_widget.tag_remove(tag, "1.0", "end")
-    
-    # Define regex patterns for different components
-    patterns = {
-        'definitionStatus': (r'(===|<<<)', 'definition_status'),
-        'conceptReference': (r'(\d+ \|[^|]+\|)', 'concept_reference'),
-        'attribute': (r'(\d+ \|[^|]+\| = \d+ \|[^|]+\|)', 'attribute'),
-        'focusConcept': (r'(\d+ \|[^|]+\|(\s*\+\s*\d+ \|[^|]+\|)*)', 'focus_concept'),
-        'refinement': (r': (\d+ \|[^|]+\| = \d+ \|[^|]+\|)', 'refinement')
-    }
-
-    # Apply tags to highlight the text
-    for pattern, tag in patterns.values():
-        for match in re.finditer(pattern, expression):
-            start, end = match.span()
-            start_idx = f"1.0 + {start} chars"
-            end_idx = f"1.0 + {end} chars"
-            text_widget.tag_add(tag, start_idx, end_idx)
-
-    # Define tag styles
-    text_widget.tag_config('definition_status', foreground='blue', font=('Helvetica', 10, 'bold'))
-    text_widget.tag_config('concept_reference', foreground='green', font=('Helvetica', 10, 'italic'))
-    text_widget.tag_config('attribute', foreground='red', font=('Helvetica', 10, 'underline'))
-    text_widget.tag_config('focus_concept', foreground='pink', font=('Helvetica', 10, 'bold'))
-    text_widget.tag_config('refinement', foreground='orange', font=('Helvetica', 10, 'italic'))
+# Longest list the duplicates window shows
+MAX_DUPLICATE_GROUPS = 5000
+# How often an open Performance panel re-reads the recorder
+PERFORMANCE_REFRESH_MS = 500
+
+
+class StartupTimer:
+    # Wall time of each startup phase, printed by --profile-startup once the window is up
+    def __init__(self, start=None, enabled=False):
+        self.start = start if start is not None else time.perf_counter()
+        self.last = self.start
+        self.enabled = enabled
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self):
+        if not self.enabled:
+            return
+        for phase, seconds in self.phases:
+            print(f"{phase:<20}{seconds * 1000:8.1f} ms", file=sys.stderr)
+        print(f"{'total':<20}{(self.last - self.start) * 1000:8.1f} ms", file=sys.stderr, flush=True)
+
 
 class TSVEditor:
-    def __init__(self, root):
+    def __init__(self, root, timer=None, trace_file=None):
         self.root = root
+        self.timer = timer or StartupTimer()
+        self.trace_file = trace_file
         self.root.title("TermForge")
         self.root.geometry("1200x800")
 
         # Apply the dark theme
         sv_ttk.set_theme("dark")
+        self.timer.mark("theme")
 
-        # Define the search terms here
+        # Define the search terms here; the first one searches without an ECL constraint
         self.search_terms = [
-            ("ECL", "ECL"),
+            ("All concepts", None),
             ("Clinical Findings", "<< 404684003 | Clinical finding (finding) |"), 
             ("Procedures", "<< 71388002 | Procedure (procedure) |"), 
             ("Body Structures", "<< 123037004 | Body structure (body structure) |")
         ]
 
         self.hidden_columns = []
+        # Set to a short description while a background load or export owns the table
+        self.busy = None
+        self.load_engine = 'pandas'
+        # Table edits since the last save are journaled next to the config, one journal per file, so a crash loses nothing
+        self.file_path = None
+        self.journal = edit_journal.EditJournal()
+        self.history = EditHistory()
+        # Canonical expression -> rows for one column, built on demand and kept up to date by edits
+        self.expression_index = None
+
+        # Network and file I/O runs as background jobs whose results come back on the Tk thread
+        self.scheduler = JobScheduler(self.root)
+
+        # Shared keep-alive session for terminology server calls, created by the first call
+        self.terminology_url = terminology.ONTOSERVER_URL
+        self.session = None
+        self.session_lock = threading.Lock()
+        self.snowstorm_url = terminology.SNOWSTORM_URL
+        self.snomed_branch = "MAIN"
+        self.snomed_version = None
+        self.validation_transport = 'get'
+        self.validation_batch_size = terminology.DEFAULT_BATCH_SIZE
+        self.cache = open_cache()
+        self.description_index = open_description_index()
+        self.closure_index = None
+        self.closure_job = None
+        self.performance_window = None
+        self.validation_job = None
+        # Results that finished while the table was busy, applied once it is free
+        self.pending_validation = None
+        self.timer.mark("state")
 
         self.create_widgets()
+        self.timer.mark("widgets")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        # Menus and the closure index wait until the window has been drawn
+        self.root.after_idle(self.finish_startup)
+
+    def finish_startup(self):
+        # Flush any geometry and redraws still queued so the window is really on screen
+        self.root.update_idletasks()
+        self.timer.mark("first paint")
         self.create_context_menu()
         self.create_popup_menus()
+        self.timer.mark("menus")
+        # The IS-A closure is a pickle that can take seconds to read, so it loads behind the open window
+        self.closure_job = self.scheduler.submit(lambda job: open_closure_index(), on_done=self.closure_loaded)
+        self.timer.report()
+        self.offer_recovery()
+
+    def closure_loaded(self, closure):
+        self.closure_job = None
+        if self.closure_index is None:
+            self.closure_index = closure
+        if self.timer.enabled:
+            print(f"{'closure index':<20}{(time.perf_counter() - self.timer.last) * 1000:8.1f} ms (background)", file=sys.stderr, flush=True)
+
+    def http_session(self):
+        # requests is only imported once something actually goes over the network
+        with self.session_lock:
+            if self.session is None:
+                self.session = terminology.create_session()
+            return self.session
 
     def create_widgets(self):
         # Create a PanedWindow to hold the resizable frames
@@ -91,6 +175,9 @@ class TSVEditor:
         self.scroll_x.grid(row=1, column=0, sticky="ew")
         self.scroll_y.grid(row=0, column=1, sticky="ns")
 
+        # Only the rows on screen get Treeview items; they are refilled from self.df on scroll
+        self.table = VirtualTable(self.tree, self.scroll_y)
+
         # Set column and row configurations for frame_table to expand properly
         self.frame_table.grid_columnconfigure(0, weight=1)
         self.frame_table.grid_rowconfigure(0, weight=1)
@@ -105,6 +192,16 @@ class TSVEditor:
         self.btn_save = ttk.Button(self.frame_load_save, text="Save TSV", command=self.save_tsv)
         self.btn_save.pack(side=tk.LEFT, padx=5)
 
+        self.btn_checkpoint = ttk.Button(self.frame_load_save, text="Checkpoint", command=self.checkpoint)
+        self.btn_checkpoint.pack(side=tk.LEFT, padx=5)
+
+        self.btn_undo = ttk.Button(self.frame_load_save, text="Undo", command=self.undo_edit)
+        self.btn_undo.pack(side=tk.LEFT, padx=5)
+
+        self.btn_redo = ttk.Button(self.frame_load_save, text="Redo", command=self.redo_edit)
+        self.btn_redo.pack(side=tk.LEFT, padx=5)
+        self.update_undo_buttons()
+
         # Export Button
         self.btn_export = ttk.Button(self.frame_load_save, text="Export", command=self.show_export_menu)
         self.btn_export.pack(side=tk.LEFT, padx=5)
@@ -113,6 +210,12 @@ class TSVEditor:
         self.btn_column_ops = ttk.Button(self.frame_load_save, text="Column Operations", command=self.show_column_menu)
         self.btn_column_ops.pack(side=tk.LEFT, padx=5)
 
+        self.btn_performance = ttk.Button(self.frame_load_save, text="Performance", command=self.open_performance)
+        self.btn_performance.pack(side=tk.LEFT, padx=5)
+
+        self.btn_settings = ttk.Button(self.frame_load_save, text="Settings", command=self.open_settings)
+        self.btn_settings.pack(side=tk.LEFT, padx=5)
+
         # Cell Editor Widgets
         self.lbl_cell = ttk.Label(self.frame_editor, text="Selected Cell", font=("Helvetica", 12, "bold"))
         self.lbl_cell.pack(pady=5)
@@ -136,6 +239,9 @@ class TSVEditor:
         self.txt_cell = scrolledtext.ScrolledText(self.frame_editor, height=10, wrap=tk.WORD, font=("Helvetica", 10), undo=True)
         self.txt_cell.pack(fill=tk.BOTH, padx=5, pady=5, expand=True)
 
+        # Highlighting follows edits, re-tagging only the lines that changed
+        self.highlighter = LiveHighlighter(self.txt_cell)
+
         # Bind right-click to show the context menu
         self.txt_cell.bind("<Button-3>", self.show_context_menu)
 
@@ -187,12 +293,28 @@ class TSVEditor:
         self.dropdown_search = ttk.OptionMenu(search_term_frame, self.search_term_var, *[term[0] for term in self.search_terms])
         self.dropdown_search.pack(side=tk.LEFT, padx=5)
 
-        self.btn_snomed_search = ttk.Button(search_term_frame, text="Search", command=self.start_snomed_search_thread)
+        self.snomed_backend_var = tk.StringVar(value="Local" if self.description_index else "Snowstorm")
+        self.dropdown_backend = ttk.OptionMenu(search_term_frame, self.snomed_backend_var, self.snomed_backend_var.get(), "Snowstorm", "Local")
+        self.dropdown_backend.pack(side=tk.LEFT, padx=5)
+
+        self.btn_snomed_search = ttk.Button(search_term_frame, text="Search", command=self.start_snomed_search)
         self.btn_snomed_search.pack(side=tk.LEFT, padx=5)
 
-        self.snomed_results_listbox = tk.Listbox(self.frame_snomed_search, width=150, height=20)
+        self.btn_import_rf2 = ttk.Button(search_term_frame, text="Import RF2", command=self.import_rf2)
+        self.btn_import_rf2.pack(side=tk.LEFT, padx=5)
+
+        self.snomed_results_scroll = ttk.Scrollbar(self.frame_snomed_search, orient=tk.VERTICAL)
+        self.snomed_results_scroll.pack(side=tk.RIGHT, fill=tk.Y, pady=10)
+        self.snomed_results_listbox = tk.Listbox(self.frame_snomed_search, width=150, height=20, yscrollcommand=self.on_snomed_results_scroll)
         self.snomed_results_listbox.pack(fill=tk.BOTH, padx=10, pady=10, expand=True)
         self.snomed_results_listbox.bind('<Double-1>', self.insert_snomed_concept)
+        self.snomed_results_scroll.configure(command=self.snomed_results_listbox.yview)
+
+        # Live type-ahead: keystrokes are debounced and only the latest query's results are shown
+        self.snomed_typeahead = SnomedTypeAhead(self.scheduler, self.fetch_snomed_page, self.display_snomed_results, self.show_snomed_error)
+        self.snomed_search_entry.bind("<KeyRelease>", self.on_snomed_search_key)
+        self.search_term_var.trace_add("write", lambda *args: self.search_snomed())
+        self.snomed_backend_var.trace_add("write", lambda *args: self.search_snomed())
 
         self.status_bar = ttk.Label(self.root, text="Rows: 0 | Current Cell: None", relief=tk.SUNKEN, anchor=tk.W)
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
@@ -214,6 +336,13 @@ class TSVEditor:
         self.export_menu.add_command(label="Export Excel", command=lambda: self.export_data('xlsx'))
         self.export_menu.add_command(label="Export JSON", command=lambda: self.export_data('json'))
         self.export_menu.add_command(label="Export TXT", command=lambda: self.export_data('txt'))
+        self.export_menu.add_command(label="Export Parquet", command=lambda: self.export_data('parquet'))
+        self.export_menu.add_command(label="Export Feather", command=lambda: self.export_data('feather'))
+        self.export_menu.add_separator()
+        self.export_menu.add_command(label="Export TSV (gzip)", command=lambda: self.export_data('tsv.gz'))
+        self.export_menu.add_command(label="Export CSV (gzip)", command=lambda: self.export_data('csv.gz'))
+        self.export_menu.add_command(label="Export TSV (zstd)", command=lambda: self.export_data('tsv.zst'))
+        self.export_menu.add_command(label="Export CSV (zstd)", command=lambda: self.export_data('csv.zst'))
 
         # Column Operations Menu
         self.column_menu = tk.Menu(self.root, tearoff=0)
@@ -221,6 +350,12 @@ class TSVEditor:
         self.column_menu.add_command(label="Show Columns", command=self.show_columns)
         self.column_menu.add_command(label="Add Column", command=self.add_column)
         self.column_menu.add_command(label="Delete Column", command=self.delete_column)
+        self.column_menu.add_separator()
+        self.column_menu.add_command(label="Validate Column", command=self.validate_column)
+        self.column_menu.add_command(label="Check ECL Scope", command=self.check_column_scope)
+        self.column_menu.add_command(label="Find/Replace in Table", command=self.open_table_replace)
+        self.column_menu.add_command(label="Find Duplicate Expressions", command=self.open_duplicates)
+        self.column_menu.add_command(label="Compare with File...", command=self.compare_with_file)
 
     def show_context_menu(self, event):
         try:
@@ -250,66 +385,297 @@ class TSVEditor:
         self.txt_cell.event_generate("<<Paste>>")
 
     def highlight_selected_text(self):
-        text = self.txt_cell.get("1.0", "end").strip()
-        highlight_snomed_expression(self.txt_cell, text)
+        self.highlighter.highlight_all()
 
     def load_tsv(self):
+        if self.is_busy():
+            return
         file_path = filedialog.askopenfilename(filetypes=[("TSV files", "*.tsv")])
         if file_path:
+            self.start_load(file_path)
+
+    def start_load(self, file_path, recovered=None, journal_path=None):
+        # Parsing runs as a background job; the first chunk is shown while the rest arrives.
+        # Recovered journal entries (read from journal_path) are replayed in the same job before the table is shown.
+        self.busy = "The file is still loading"
+        # Results for the table being replaced have nowhere to go
+        self.pending_validation = None
+        history = EditHistory()
+
+        def work(job):
+            df = tsv_loader.load_tsv_chunked(
+                file_path,
+                on_first_chunk=None if recovered else lambda chunk: job.progress(('first', chunk)),
+                on_progress=lambda fraction: job.progress(('progress', fraction)),
+                engine=self.load_engine,
+                cancelled=job.cancelled
+            )
+            if recovered:
+                edit_journal.replay(df, recovered, history)
+            return df
+
+        self.scheduler.submit(
+            work,
+            on_progress=self.load_progress,
+            on_done=lambda df: self.finish_load(df, file_path, recovered, history, journal_path),
+            on_error=lambda e: self.job_failed("Failed to load file", e)
+        )
+        self.status_bar.config(text="Recovering..." if recovered else "Loading...")
+
+    def load_progress(self, message):
+        if message[0] == 'first':
+            self.df = message[1]
+            self.update_treeview()
+        else:
+            self.status_bar.config(text=f"Loading... {message[1]:.0%} | Rows so far: {len(self.df) if self.df is not None else 0}")
+
+    def finish_load(self, df, file_path, recovered, history, journal_path=None):
+        self.release_busy()
+        self.df = df
+        self.file_path = file_path
+        self.history = history
+        self.update_undo_buttons()
+        self.expression_index = None
+        if recovered:
+            self.journal.resume(journal_path, len(recovered))
+        else:
+            self.journal.start(file_path)
+        self.update_treeview()
+        self.update_status_bar()
+        if not self.journal.active:
+            self.status_bar.config(text="Edit journal unavailable: the file is open in another window or the config folder is not writable")
+
+    def job_failed(self, message, error):
+        self.release_busy()
+        messagebox.showerror("Error", f"{message}: {error}")
+
+    def offer_recovery(self):
+        # Journals held by another open window are not offered; a window recovers one file at most
+        for journal_path, base, entries in edit_journal.pending_journals(self.journal.directory):
+            if not os.path.exists(base['path']):
+                messagebox.showwarning("Warning", f"Unsaved edits were found for {base['path']}, but the file no longer exists")
+                edit_journal.discard_journal(journal_path)
+                continue
+            prompt = f"TermForge closed with {len(entries)} unsaved edits to {os.path.basename(base['path'])}. Recover them?"
+            if edit_journal.base_changed(base):
+                prompt += "\n\nThe file has changed since, so the edits may not apply cleanly."
+            if messagebox.askyesno("Recover Edits", prompt):
+                self.start_load(base['path'], recovered=entries, journal_path=journal_path)
+                return
+            edit_journal.discard_journal(journal_path)
+
+    def apply_edit(self, entry):
+        # Every table edit is applied through the undo history and then journaled
+        with instrumentation.span(f"edit {entry['op']}", 'table', rows=len(self.df)):
+            result = self.history.apply(self.df, entry)
+        self.record_edit(entry)
+        self.track_expression_index(entry)
+        self.update_undo_buttons()
+        return result
+
+    def update_undo_buttons(self):
+        self.btn_undo.state(["!disabled"] if self.history.can_undo() else ["disabled"])
+        self.btn_redo.state(["!disabled"] if self.history.can_redo() else ["disabled"])
+
+    def record_edit(self, entry):
+        try:
+            self.journal.record(entry)
+        except OSError as e:
+            self.status_bar.config(text=f"Edit journal unavailable: {e}")
+
+    def undo_edit(self):
+        if self.is_busy() or self.df is None:
+            return
+        entry = self.history.undo(self.df)
+        if entry is None:
+            self.status_bar.config(text="Nothing to undo")
+            return
+        self.record_edit({'op': 'undo'})
+        self.track_expression_index(entry)
+        self.update_undo_buttons()
+        self.refresh_after_edit(entry)
+
+    def redo_edit(self):
+        if self.is_busy() or self.df is None:
+            return
+        entry = self.history.redo(self.df)
+        if entry is None:
+            self.status_bar.config(text="Nothing to redo")
+            return
+        self.record_edit({'op': 'redo'})
+        self.track_expression_index(entry)
+        self.update_undo_buttons()
+        self.refresh_after_edit(entry)
+
+    def track_expression_index(self, entry):
+        # Cell edits move one row between groups; anything that reorders rows or
+        # rewrites the indexed column drops the index until it is next needed
+        index = self.expression_index
+        if index is None:
+            return
+        op = entry['op']
+        if op == 'set':
+            if entry['col'] == index.column:
+                index.update(entry['row'], self.df.iat[entry['row'], self.df.columns.get_loc(index.column)])
+        elif op == 'sort' or (op == 'replace' and index.column in entry['columns']) or entry.get('name') == index.column:
+            self.expression_index = None
+
+    def refresh_after_edit(self, entry):
+        if entry['op'] == 'set':
+            self.table.row_changed(entry['row'])
+        elif entry['op'] == 'sort':
+            self.table.rows_reordered()
+        else:
+            self.hidden_columns = [col for col in self.hidden_columns if col in self.df.columns]
+            self.configure_tree_columns()
+            self.table.columns_changed(self.tree["columns"])
+        self.update_status_bar()
+
+    def checkpoint(self):
+        # Compacts the journal by rewriting the base TSV in the background, then starts a fresh journal
+        if self.is_busy():
+            return
+        if self.df is None or self.file_path is None:
+            self.save_tsv()
+            return
+        file_path = self.file_path
+        df = self.df
+
+        def work(job):
+            exporters.export_frame(df, file_path + ".checkpoint", 'tsv', on_progress=job.progress)
+            os.replace(file_path + ".checkpoint", file_path)
+
+        self.busy = "A checkpoint is in progress"
+        self.scheduler.submit(
+            work,
+            on_progress=lambda fraction: self.status_bar.config(text=f"Checkpoint... {fraction:.0%}"),
+            on_done=lambda result: self.finish_save(file_path, None),
+            on_error=lambda e: self.job_failed("Checkpoint failed", e)
+        )
+
+    def finish_save(self, file_path, message):
+        # The fresh journal cannot replay undos of edits now in the base file
+        self.release_busy()
+        self.file_path = file_path
+        self.journal.start(file_path)
+        self.history.clear()
+        self.update_undo_buttons()
+        self.update_status_bar()
+        if message:
+            messagebox.showinfo("Success", message)
+
+    def on_close(self):
+        if self.trace_file:
             try:
-                self.df = pd.read_csv(file_path, delimiter='\t')
-                self.update_treeview()
-                self.update_status_bar()
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to load file: {e}")
+                instrumentation.recorder.export_trace(self.trace_file)
+            except OSError as e:
+                print(f"Could not write trace: {e}", file=sys.stderr)
+        # A journal with edits is kept so the next start can offer to recover them
+        if self.journal.edits == 0:
+            self.journal.discard()
+        else:
+            self.journal.close()
+        self.scheduler.shutdown()
+        self.cache.close()
+        self.root.destroy()
+
+    def is_busy(self):
+        # Edits are held back while a background load or export is using the table
+        if self.busy:
+            messagebox.showwarning("Warning", self.busy)
+        return self.busy is not None
+
+    def release_busy(self):
+        self.busy = None
+        if self.pending_validation is not None:
+            # Applied once the caller has finished its own bookkeeping, e.g. restarting the journal after a save
+            col_name, results = self.pending_validation
+            self.pending_validation = None
+            self.root.after_idle(lambda: self.apply_validation_results(col_name, results))
 
     def save_tsv(self):
+        if self.is_busy():
+            return
         if self.df is not None:
             file_path = filedialog.asksaveasfilename(defaultextension=".tsv", filetypes=[("TSV files", "*.tsv")])
             if file_path:
-                try:
-                    self.df.to_csv(file_path, sep='\t', index=False)
-                    messagebox.showinfo("Success", "File saved successfully!")
-                except Exception as e:
-                    messagebox.showerror("Error", f"Failed to save file: {e}")
+                df = self.df
+
+                # Written beside the target and swapped in, so a crash never leaves a
+                # truncated base file for the journal to replay onto
+                def work(job):
+                    temp_path = file_path + ".saving"
+                    try:
+                        df.to_csv(temp_path, sep='\t', index=False)
+                        os.replace(temp_path, file_path)
+                    except Exception:
+                        if os.path.exists(temp_path):
+                            os.remove(temp_path)
+                        raise
+
+                self.busy = "The file is being saved"
+                self.scheduler.submit(
+                    work,
+                    on_done=lambda result: self.finish_save(file_path, "File saved successfully!"),
+                    on_error=lambda e: self.job_failed("Failed to save file", e)
+                )
         else:
             messagebox.showwarning("Warning", "No data to save")
 
+    @instrumentation.timed('update_treeview', 'ui')
     def update_treeview(self):
-        self.tree.delete(*self.tree.get_children())
-        self.tree["columns"] = [col for col in self.df.columns if col not in self.hidden_columns]
-        for col in self.tree["columns"]:
+        self.configure_tree_columns()
+        self.table.load(self.df, self.tree["columns"])
+
+        self.tree.bind("<ButtonRelease-1>", self.on_cell_select)
+        self.tree.bind("<Control-z>", lambda event: self.undo_edit())
+        self.tree.bind("<Control-y>", lambda event: self.redo_edit())
+
+    def configure_tree_columns(self):
+        # The Treeview carries every DataFrame column; hidden ones are left out of displaycolumns
+        self.tree["columns"] = list(self.df.columns)
+        for col in self.df.columns:
             self.tree.heading(col, text=col, command=lambda _col=col: self.sort_treeview_column(_col, False))
             self.tree.column(col, width=100)
+        self.update_display_columns()
 
-        for index, row in self.df.iterrows():
-            values = [row[col] for col in self.tree["columns"]]
-            self.tree.insert("", "end", values=values)
+    def display_columns(self):
+        return [col for col in self.df.columns if col not in self.hidden_columns]
 
-        self.tree.bind("<ButtonRelease-1>", self.on_cell_select)
+    def update_display_columns(self):
+        self.tree["displaycolumns"] = self.display_columns()
 
     def update_status_bar(self):
         num_rows = len(self.df) if self.df is not None else 0
         current_cell = f"Row: {self.selected_row}, Column: {self.selected_col}" if hasattr(self, 'selected_row') and hasattr(self, 'selected_col') else "None"
-        self.status_bar.config(text=f"Rows: {num_rows} | Current Cell: {current_cell}")
+        duplicates = ""
+        index = self.expression_index
+        if index is not None and current_cell != "None" and self.selected_col < len(self.df.columns) and self.df.columns[self.selected_col] == index.column:
+            value = self.df.iat[self.selected_row, self.selected_col]
+            if isinstance(value, str) and value.strip():
+                duplicates = f" | Same expression: {len(index.rows(value))} rows"
+        self.status_bar.config(text=f"Rows: {num_rows} | Current Cell: {current_cell}{duplicates} | {self.cache.summary()}")
 
     def on_cell_select(self, event):
         selected_item = self.tree.selection()[0]
-        cell_value = self.tree.item(selected_item, "values")
         col_index = self.tree.identify_column(event.x)[1:]
-        row_index = self.tree.index(selected_item)
+        row_index = self.table.row_at(selected_item)
         self.selected_row = row_index
-        self.selected_col = int(col_index) - 1
+        self.table.select_row(row_index)
+        col_name = self.display_columns()[int(col_index) - 1]
+        self.selected_col = self.df.columns.get_loc(col_name)
         self.txt_cell.delete("1.0", "end")
-        self.txt_cell.insert("end", cell_value[self.selected_col])
+        self.txt_cell.insert("end", self.selected_cell_text())
         self.highlight_selected_text()  # Highlight the cell content
         self.update_status_bar()
 
     def update_cell(self):
+        if self.is_busy():
+            return
         new_value = self.txt_cell.get("1.0", "end").strip()
         if self.df is not None and hasattr(self, 'selected_row') and hasattr(self, 'selected_col'):
-            self.df.iat[self.selected_row, self.selected_col] = new_value
-            self.update_treeview()
+            self.apply_edit({'op': 'set', 'row': int(self.selected_row), 'col': self.df.columns[self.selected_col], 'value': new_value})
+            self.table.row_changed(self.selected_row)
             self.update_status_bar()
         else:
             messagebox.showwarning("Warning", "No cell selected")
@@ -320,33 +686,131 @@ class TSVEditor:
             messagebox.showwarning("Warning", "No code to validate")
             return
 
-        url = "https://r4.ontoserver.csiro.au/fhir/CodeSystem/$validate-code"
-        system = "http://snomed.info/sct"
-        headers = {
-            'Accept': 'application/fhir+json',
-            'Content-Type': 'application/fhir+json'
-        }
-        params = {
-            'url': system,
-            'code': code,
-            'system': system
-        }
+        # Malformed expressions are reported without a round trip to the server
+        error = syntax_error(code)
+        if error is not None:
+            self.response_text.delete("1.0", "end")
+            self.response_text.insert("end", f"Syntax error: {error}")
+            return
+
+        self.scheduler.submit(
+            lambda job: terminology.validate_code(self.http_session(), code, self.terminology_url, cache=self.cache, version=self.snomed_version),
+            priority=PRIORITY_INTERACTIVE,
+            on_done=self.show_validation_response,
+            on_error=lambda e: messagebox.showerror("Error", f"Error making request: {str(e)}")
+        )
+
+    def show_validation_response(self, response_json):
+        pretty_response = json.dumps(response_json, indent=4)
+        self.response_text.delete("1.0", "end")
+        self.response_text.insert("end", pretty_response)
+        self.update_status_bar()
 
+    def validate_column(self):
+        if self.is_busy():
+            return
+        if self.df is None or not hasattr(self, 'selected_col'):
+            messagebox.showwarning("Warning", "No column selected")
+            return
+        if self.validation_job is not None:
+            messagebox.showwarning("Warning", "A column validation is already running")
+            return
+
+        col_name = self.df.columns[self.selected_col]
+        codes = terminology.distinct_codes(self.df[col_name])
+        validator = terminology.ColumnValidator(
+            self.terminology_url, session=self.http_session(), cache=self.cache, version=self.snomed_version,
+            transport=self.validation_transport, batch_size=self.validation_batch_size
+        )
+        def work(job):
+            # Cancelling the job (e.g. on exit) stops the validator's own worker pool
+            job.add_cancel_hook(validator.cancel)
+            return validator.run(codes, on_progress=lambda done, total: job.progress(done))
+
+        # Bulk validation yields to interactive jobs; Cancel keeps the results gathered so far
+        self.open_validation_progress(col_name, len(codes), validator)
+        self.validation_job = self.scheduler.submit(
+            work,
+            priority=PRIORITY_BULK,
+            on_progress=lambda done: self.validation_progress.configure(value=done),
+            on_done=lambda results: self.finish_validation(col_name, results),
+            on_error=lambda e: self.finish_validation(col_name, None, e),
+            on_cancel=lambda: self.finish_validation(col_name, None)
+        )
+
+    def open_validation_progress(self, col_name, total, validator):
+        self.validation_window = tk.Toplevel(self.root)
+        self.validation_window.title("Validate Column")
+        ttk.Label(self.validation_window, text=f"Validating {total} distinct codes in '{col_name}'").pack(padx=10, pady=5)
+        self.validation_progress = ttk.Progressbar(self.validation_window, length=300, maximum=max(total, 1))
+        self.validation_progress.pack(padx=10, pady=5)
+        ttk.Button(self.validation_window, text="Cancel", command=validator.cancel).pack(pady=5)
+        # Closing the window cancels too; it goes away once the run has stopped
+        self.validation_window.protocol("WM_DELETE_WINDOW", validator.cancel)
+
+    def finish_validation(self, col_name, results, error=None):
+        self.validation_job = None
+        self.validation_window.destroy()
+        if error is not None:
+            messagebox.showerror("Error", f"Validation failed: {error}")
+        elif results is None:
+            self.status_bar.config(text="Validation cancelled")
+        else:
+            self.apply_validation_results(col_name, results)
+
+    def apply_validation_results(self, col_name, results):
+        if self.df is None or col_name not in self.df.columns:
+            return
+        if self.busy:
+            # An export or checkpoint may still be reading the frame; the column is added after it
+            self.pending_validation = (col_name, results)
+            self.status_bar.config(text=f"Validation finished; results are added when this is done: {self.busy}")
+            return
+        status_col = f"{col_name} validation"
+        self.apply_edit({'op': 'derive', 'name': status_col, 'source': col_name, 'mapping': results, 'default': ""})
+        self.configure_tree_columns()
+        self.table.columns_changed(self.tree["columns"])
+        self.update_status_bar()
+
+    def check_column_scope(self):
+        if self.is_busy():
+            return
+        if self.df is None or not hasattr(self, 'selected_col'):
+            messagebox.showwarning("Warning", "No column selected")
+            return
+        if self.closure_job is not None and self.scheduler.is_active(self.closure_job):
+            messagebox.showinfo("Info", "The local hierarchy is still loading, try again in a moment")
+            return
+        if self.closure_index is None:
+            messagebox.showwarning("Warning", "No local hierarchy found. Use Import RF2 with an RF2 Relationship snapshot first.")
+            return
+
+        selected_search_term = self.search_term_var.get()
+        default_ecl = next((term[1] for term in self.search_terms if term[0] == selected_search_term), None) or ""
+        ecl = simpledialog.askstring("Check ECL Scope", "ECL constraint (<, <<, > or >> a concept):", initialvalue=default_ecl)
+        if not ecl:
+            return
+
+        col_name = self.df.columns[self.selected_col]
         try:
-            response = requests.get(url, params=params, headers=headers)
-            response.raise_for_status()
-            response_json = response.json()
-            pretty_response = json.dumps(response_json, indent=4)
-            self.response_text.delete("1.0", "end")
-            self.response_text.insert("end", pretty_response)
-        except requests.RequestException as e:
-            messagebox.showerror("Error", f"Error making request: {str(e)}")
+            answers = scope_answers(self.df[col_name], self.closure_index, ecl)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.apply_edit({'op': 'derive', 'name': f"{col_name} in scope", 'source': col_name, 'mapping': answers, 'default': False})
+        self.configure_tree_columns()
+        self.table.columns_changed(self.tree["columns"])
 
     def delete_column(self):
+        if self.is_busy():
+            return
         if self.df is not None and hasattr(self, 'selected_col'):
             col_name = self.df.columns[self.selected_col]
-            self.df.drop(columns=[col_name], inplace=True)
-            self.update_treeview()
+            self.apply_edit({'op': 'delete_column', 'name': col_name})
+            if col_name in self.hidden_columns:
+                self.hidden_columns.remove(col_name)
+            self.configure_tree_columns()
+            self.table.columns_changed(self.tree["columns"])
             self.update_status_bar()
         else:
             messagebox.showwarning("Warning", "No column selected")
@@ -356,20 +820,26 @@ class TSVEditor:
             col_name = self.df.columns[self.selected_col]
             if col_name not in self.hidden_columns:
                 self.hidden_columns.append(col_name)
-                self.update_treeview()
+                self.update_display_columns()
         else:
             messagebox.showwarning("Warning", "No column selected")
 
     def show_columns(self):
         self.hidden_columns = []
-        self.update_treeview()
+        if self.df is not None:
+            self.update_display_columns()
 
     def add_column(self):
+        if self.is_busy():
+            return
         if self.df is not None:
             col_name = simpledialog.askstring("Add Column", "Enter column name:")
-            if col_name:
-                self.df[col_name] = ""
-                self.update_treeview()
+            if col_name in self.df.columns:
+                messagebox.showwarning("Warning", f"Column '{col_name}' already exists")
+            elif col_name:
+                self.apply_edit({'op': 'add_column', 'name': col_name})
+                self.configure_tree_columns()
+                self.table.column_appended(col_name)
         else:
             messagebox.showwarning("Warning", "No data to add column to")
 
@@ -406,10 +876,16 @@ class TSVEditor:
         self.txt_cell.insert(cursor_index, option)
         self.popup.destroy()
 
+    def selected_cell_text(self):
+        # Read from the DataFrame: Treeview items lag behind columns added since the last refresh
+        value = self.df.iat[self.selected_row, self.selected_col]
+        return "" if pd.isna(value) else str(value)
+
     def compare_cell(self):
-        selected_item = self.tree.selection()[0]
-        cell_value = self.tree.item(selected_item, "values")
-        self.compare_popup(cell_value[self.selected_col])
+        if self.df is None or not hasattr(self, 'selected_row') or not hasattr(self, 'selected_col'):
+            messagebox.showwarning("Warning", "No cell selected")
+            return
+        self.compare_popup(self.selected_cell_text())
 
     def compare_popup(self, cell_value):
         self.compare_window = tk.Toplevel(self.root)
@@ -418,6 +894,81 @@ class TSVEditor:
         self.compare_text.pack(fill=tk.BOTH, padx=5, pady=5, expand=True)
         self.compare_text.insert("end", cell_value)
 
+    def compare_with_file(self):
+        # Diffs the loaded table (as the old release) against another TSV, joined on the selected column
+        if self.df is None or not hasattr(self, 'selected_col'):
+            messagebox.showwarning("Warning", "Select a cell in the key column first")
+            return
+        if self.is_busy():
+            return
+        key = self.df.columns[self.selected_col]
+        file_path = filedialog.askopenfilename(title=f"Compare with file (key: {key})", filetypes=[("TSV files", "*.tsv")])
+        if not file_path:
+            return
+
+        def work(job):
+            other = tsv_loader.load_tsv_chunked(file_path, on_progress=job.progress, engine=self.load_engine, cancelled=job.cancelled)
+            if other is None:
+                return None
+            return release_diff.diff_frames(df, other, key)
+
+        df = self.df
+        self.busy = "A comparison is in progress"
+        self.scheduler.submit(
+            work,
+            on_progress=lambda fraction: self.status_bar.config(text=f"Loading {os.path.basename(file_path)}... {fraction:.0%}"),
+            on_done=lambda result: self.show_diff(result, key, file_path),
+            on_error=lambda e: self.job_failed("Comparison failed", e)
+        )
+
+    def show_diff(self, result, key, file_path):
+        self.release_busy()
+        self.update_status_bar()
+        diff, summary = result
+        self.diff = diff
+
+        self.diff_window = tk.Toplevel(self.root)
+        self.diff_window.title(f"Compare with {os.path.basename(file_path)} on '{key}'")
+        self.diff_window.geometry("1000x600")
+        ttk.Label(self.diff_window, text=release_diff.summary_text(summary)).pack(padx=10, pady=5, anchor="w")
+
+        frame = ttk.Frame(self.diff_window)
+        frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        tree = ttk.Treeview(frame, show='headings')
+        tree.grid(row=0, column=0, sticky="nsew")
+        scroll_x = ttk.Scrollbar(frame, orient=tk.HORIZONTAL, command=tree.xview)
+        scroll_y = ttk.Scrollbar(frame, orient=tk.VERTICAL)
+        tree.configure(xscrollcommand=scroll_x.set)
+        scroll_x.grid(row=1, column=0, sticky="ew")
+        scroll_y.grid(row=0, column=1, sticky="ns")
+        frame.grid_columnconfigure(0, weight=1)
+        frame.grid_rowconfigure(0, weight=1)
+
+        tree["columns"] = list(diff.columns)
+        for col in diff.columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=120)
+        self.diff_table = VirtualTable(tree, scroll_y)
+        self.diff_table.load(diff, tree["columns"])
+
+        ttk.Button(self.diff_window, text="Export Diff", command=self.export_diff).pack(pady=5)
+
+    def export_diff(self):
+        file_path = filedialog.asksaveasfilename(
+            parent=self.diff_window, defaultextension=".tsv",
+            filetypes=[("TSV files", "*.tsv"), ("CSV files", "*.csv"), ("Excel files", "*.xlsx"), ("Parquet files", "*.parquet")]
+        )
+        if not file_path:
+            return
+        export_format, compression = exporters.path_format(file_path)
+        diff = self.diff
+        self.scheduler.submit(
+            lambda job: exporters.export_frame(diff, file_path, export_format, compression, on_progress=job.progress),
+            on_progress=lambda fraction: self.status_bar.config(text=f"Exporting diff... {fraction:.0%}"),
+            on_done=lambda result: messagebox.showinfo("Success", "Diff exported successfully!", parent=self.diff_window),
+            on_error=lambda e: messagebox.showerror("Error", f"Failed to export diff: {e}", parent=self.diff_window)
+        )
+
     def search_text(self):
         search_term = self.search_entry.get()
         self.txt_cell.tag_remove('search', '1.0', tk.END)
@@ -442,30 +993,281 @@ class TSVEditor:
         self.txt_cell.delete("1.0", tk.END)
         self.txt_cell.insert("1.0", new_content)
 
+    def open_duplicates(self):
+        if self.df is None or not hasattr(self, 'selected_col'):
+            messagebox.showwarning("Warning", "No column selected")
+            return
+        col_name = self.df.columns[self.selected_col]
+        if self.expression_index is not None and self.expression_index.column == col_name:
+            self.show_duplicates()
+            return
+        if self.is_busy():
+            return
+
+        # Canonicalizing every distinct expression can take a while on big files
+        self.busy = "Expressions are being indexed"
+        df = self.df
+        self.scheduler.submit(
+            lambda job: expression_index.ExpressionIndex(df, col_name),
+            priority=PRIORITY_BULK,
+            on_done=self.finish_expression_index,
+            on_error=lambda e: self.job_failed("Failed to index expressions", e)
+        )
+        self.status_bar.config(text=f"Indexing expressions in '{col_name}'...")
+
+    def finish_expression_index(self, index):
+        self.release_busy()
+        self.expression_index = index
+        self.update_status_bar()
+        self.show_duplicates()
+
+    def show_duplicates(self):
+        index = self.expression_index
+        self.duplicates_window = tk.Toplevel(self.root)
+        self.duplicates_window.title(f"Duplicate Expressions in '{index.column}'")
+
+        ttk.Label(self.duplicates_window, text="Conflicts in").grid(row=0, column=0, padx=10, pady=5, sticky="w")
+        self.duplicates_compare_var = tk.StringVar(value="(none)")
+        compare = ttk.Combobox(
+            self.duplicates_window, textvariable=self.duplicates_compare_var, state="readonly",
+            values=["(none)"] + [col for col in self.df.columns if col != index.column]
+        )
+        compare.grid(row=0, column=1, padx=10, pady=5, sticky="ew")
+        compare.bind("<<ComboboxSelected>>", lambda event: self.list_duplicates())
+
+        self.duplicates_listbox = tk.Listbox(self.duplicates_window, width=80, height=15, exportselection=False)
+        self.duplicates_listbox.grid(row=1, column=0, columnspan=2, padx=10, pady=5, sticky="nsew")
+        self.duplicates_listbox.bind("<<ListboxSelect>>", lambda event: self.go_to_duplicate(0))
+
+        self.duplicates_label = ttk.Label(self.duplicates_window, text="", justify=tk.LEFT)
+        self.duplicates_label.grid(row=2, column=0, columnspan=2, padx=10, pady=5, sticky="w")
+
+        buttons_frame = ttk.Frame(self.duplicates_window)
+        buttons_frame.grid(row=3, column=0, columnspan=2, pady=10)
+        ttk.Button(buttons_frame, text="Next Row", command=lambda: self.go_to_duplicate(1)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="Refresh", command=self.list_duplicates).pack(side=tk.LEFT, padx=5)
+        self.list_duplicates()
+
+    def list_duplicates(self):
+        if self.expression_index is None:
+            # An edit invalidated the index; rebuild it for the same column
+            self.duplicates_window.destroy()
+            self.open_duplicates()
+            return
+        compare = self.duplicates_compare_var.get()
+        if compare != "(none)" and compare in self.df.columns:
+            self.duplicate_groups = self.expression_index.conflicts(self.df, compare)
+            kind = "conflicting"
+        else:
+            self.duplicate_groups = self.expression_index.duplicates()
+            kind = "duplicated"
+        self.duplicate_groups = self.duplicate_groups[:MAX_DUPLICATE_GROUPS]
+        self.duplicate_cursor = 0
+        self.duplicates_listbox.delete(0, tk.END)
+        for key, rows in self.duplicate_groups:
+            self.duplicates_listbox.insert(tk.END, f"{len(rows):>6} rows | {key}")
+        self.duplicates_label.config(text=f"{len(self.duplicate_groups):,} {kind} expressions")
+
+    def go_to_duplicate(self, step):
+        selection = self.duplicates_listbox.curselection()
+        if not selection or self.expression_index is None:
+            return
+        key, rows = self.duplicate_groups[selection[0]]
+        self.duplicate_cursor = (self.duplicate_cursor + step) % len(rows) if step else 0
+        row = int(rows[self.duplicate_cursor])
+        shown = ", ".join(str(r) for r in rows[:20]) + (" ..." if len(rows) > 20 else "")
+        self.duplicates_label.config(text=f"Row {self.duplicate_cursor + 1} of {len(rows)} | Rows: {shown}")
+
+        self.selected_row = row
+        self.selected_col = self.df.columns.get_loc(self.expression_index.column)
+        self.table.show_row(row)
+        self.txt_cell.delete("1.0", "end")
+        self.txt_cell.insert("end", self.table.row_values(row)[self.selected_col])
+        self.highlight_selected_text()
+        self.update_status_bar()
+
+    def open_table_replace(self):
+        if self.df is None:
+            messagebox.showwarning("Warning", "No data to search")
+            return
+        self.table_replace_window = tk.Toplevel(self.root)
+        self.table_replace_window.title("Find/Replace in Table")
+
+        ttk.Label(self.table_replace_window, text="Find").grid(row=0, column=0, padx=10, pady=5, sticky="w")
+        self.table_find_entry = ttk.Entry(self.table_replace_window, width=40)
+        self.table_find_entry.grid(row=0, column=1, padx=10, pady=5)
+        self.table_find_entry.insert(0, self.search_entry.get())
+
+        ttk.Label(self.table_replace_window, text="Replace").grid(row=1, column=0, padx=10, pady=5, sticky="w")
+        self.table_replace_entry = ttk.Entry(self.table_replace_window, width=40)
+        self.table_replace_entry.grid(row=1, column=1, padx=10, pady=5)
+        self.table_replace_entry.insert(0, self.replace_entry.get())
+
+        options_frame = ttk.Frame(self.table_replace_window)
+        options_frame.grid(row=2, column=0, columnspan=2, pady=5)
+        self.table_regex_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Regex", variable=self.table_regex_var).pack(side=tk.LEFT, padx=5)
+        self.table_case_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(options_frame, text="Match case", variable=self.table_case_var).pack(side=tk.LEFT, padx=5)
+
+        # Searchable columns, with the selected column preselected (all of them otherwise)
+        ttk.Label(self.table_replace_window, text="Columns").grid(row=3, column=0, padx=10, pady=5, sticky="nw")
+        self.table_columns_listbox = tk.Listbox(self.table_replace_window, selectmode=tk.MULTIPLE, height=8, exportselection=False)
+        self.table_columns_listbox.grid(row=3, column=1, padx=10, pady=5, sticky="ew")
+        columns = table_search.searchable_columns(self.df)
+        selected = self.df.columns[self.selected_col] if hasattr(self, 'selected_col') and self.selected_col < len(self.df.columns) else None
+        for i, col in enumerate(columns):
+            self.table_columns_listbox.insert(tk.END, col)
+            if selected is None or col == selected:
+                self.table_columns_listbox.selection_set(i)
+
+        self.table_preview_label = ttk.Label(self.table_replace_window, text="", justify=tk.LEFT)
+        self.table_preview_label.grid(row=4, column=0, columnspan=2, padx=10, pady=5, sticky="w")
+
+        buttons_frame = ttk.Frame(self.table_replace_window)
+        buttons_frame.grid(row=5, column=0, columnspan=2, pady=10)
+        ttk.Button(buttons_frame, text="Preview", command=self.preview_table_replace).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="Replace All", command=self.apply_table_replace).pack(side=tk.LEFT, padx=5)
+
+    def table_replace_columns(self):
+        return [self.table_columns_listbox.get(i) for i in self.table_columns_listbox.curselection()]
+
+    def preview_table_replace(self):
+        pattern = self.table_find_entry.get()
+        if not pattern:
+            return
+        try:
+            counts = table_search.match_counts(self.df, self.table_replace_columns(), pattern, self.table_regex_var.get(), self.table_case_var.get())
+        except re.error as e:
+            messagebox.showerror("Error", f"Invalid regular expression: {e}", parent=self.table_replace_window)
+            return
+        lines = [f"{col}: {rows:,} rows, {matches:,} matches" for col, (rows, matches) in counts.items()]
+        self.table_preview_label.config(text="\n".join(lines) or "No columns selected")
+
+    def apply_table_replace(self):
+        if self.is_busy():
+            return
+        pattern = self.table_find_entry.get()
+        if not pattern:
+            return
+        entry = {
+            'op': 'replace', 'columns': self.table_replace_columns(), 'pattern': pattern, 'replacement': self.table_replace_entry.get(),
+            'regex': self.table_regex_var.get(), 'case': self.table_case_var.get()
+        }
+        try:
+            old_columns, rows = self.apply_edit(entry)
+        except re.error as e:
+            messagebox.showerror("Error", f"Invalid regular expression: {e}", parent=self.table_replace_window)
+            return
+        self.table.rows_changed(rows)
+        self.table_preview_label.config(text=f"Replaced in {len(rows):,} rows")
+
     def sort_treeview_column(self, col, reverse):
+        if self.is_busy():
+            return
         if self.df is not None:
-            self.df.sort_values(by=col, ascending=not reverse, inplace=True)
-            self.update_treeview()
+            self.apply_edit({'op': 'sort', 'col': col, 'ascending': not reverse})
+            self.table.rows_reordered()
             self.tree.heading(col, command=lambda: self.sort_treeview_column(col, not reverse))
 
-    def export_data(self, export_format):
-        if self.df is not None:
-            file_path = filedialog.asksaveasfilename(defaultextension=f".{export_format}", filetypes=[(f"{export_format.upper()} files", f"*.{export_format}")])
-            if file_path:
-                try:
-                    if export_format == 'csv':
-                        self.df.to_csv(file_path, index=False)
-                    elif export_format == 'xlsx':
-                        self.df.to_excel(file_path, index=False)
-                    elif export_format == 'json':
-                        self.df.to_json(file_path, orient='records', lines=True)
-                    elif export_format == 'txt':
-                        self.df.to_csv(file_path, sep="\t", index=False)
-                    messagebox.showinfo("Success", f"File exported successfully as {export_format.upper()}!")
-                except Exception as e:
-                    messagebox.showerror("Error", f"Failed to export file: {e}")
-        else:
+    def export_data(self, extension):
+        if self.is_busy():
+            return
+        if self.df is None:
             messagebox.showwarning("Warning", "No data to export")
+            return
+        file_path = filedialog.asksaveasfilename(defaultextension=f".{extension}", filetypes=[(f"{extension.upper()} files", f"*.{extension}")])
+        if not file_path:
+            return
+
+        # The table is written in chunks by a background job; edits wait until it finishes
+        export_format, compression = exporters.path_format(file_path, exporters.format_for_path(f"x.{extension}"))
+        df = self.df
+        self.busy = "An export is in progress"
+        job_id = self.scheduler.submit(
+            lambda job: exporters.export_frame(df, file_path, export_format, compression, on_progress=job.progress, cancelled=job.cancelled),
+            on_progress=lambda fraction: self.export_progress.configure(value=fraction),
+            on_done=lambda result: self.finish_export(f"File exported successfully as {extension.upper()}!"),
+            on_error=lambda e: self.finish_export(None, e),
+            on_cancel=lambda: self.finish_export(None)
+        )
+
+        self.export_window = tk.Toplevel(self.root)
+        self.export_window.title("Export")
+        ttk.Label(self.export_window, text=f"Exporting {len(df)} rows to {os.path.basename(file_path)}").pack(padx=10, pady=5)
+        self.export_progress = ttk.Progressbar(self.export_window, length=300, maximum=1.0)
+        self.export_progress.pack(padx=10, pady=5)
+        ttk.Button(self.export_window, text="Cancel", command=lambda: self.scheduler.cancel(job_id)).pack(pady=5)
+        self.export_window.protocol("WM_DELETE_WINDOW", lambda: self.scheduler.cancel(job_id))
+
+    def finish_export(self, message, error=None):
+        self.release_busy()
+        self.export_window.destroy()
+        if error is not None:
+            messagebox.showerror("Error", f"Failed to export file: {error}")
+        elif message:
+            messagebox.showinfo("Success", message)
+        else:
+            self.status_bar.config(text="Export cancelled")
+
+    def open_performance(self):
+        # Live timings of the instrumented paths; recording is off until switched on here or with --instrument
+        if self.performance_window is not None and self.performance_window.winfo_exists():
+            self.performance_window.lift()
+            return
+        self.performance_window = tk.Toplevel(self.root)
+        self.performance_window.title("Performance")
+        self.performance_window.geometry("640x400")
+
+        controls = ttk.Frame(self.performance_window)
+        controls.pack(fill=tk.X, padx=10, pady=5)
+        self.recording_var = tk.BooleanVar(value=instrumentation.recorder.enabled)
+        ttk.Checkbutton(
+            controls, text="Record timings", variable=self.recording_var,
+            command=lambda: instrumentation.recorder.enable(self.recording_var.get())
+        ).pack(side=tk.LEFT, padx=5)
+        ttk.Button(controls, text="Reset", command=instrumentation.recorder.reset).pack(side=tk.LEFT, padx=5)
+        ttk.Button(controls, text="Export Trace...", command=self.export_trace).pack(side=tk.LEFT, padx=5)
+
+        columns = ("calls", "total ms", "mean ms", "max ms", "last ms")
+        self.performance_tree = ttk.Treeview(self.performance_window, columns=columns)
+        self.performance_tree.heading("#0", text="span")
+        self.performance_tree.column("#0", width=200)
+        for col in columns:
+            self.performance_tree.heading(col, text=col)
+            self.performance_tree.column(col, width=80, anchor=tk.E)
+        self.performance_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.counters_label = ttk.Label(self.performance_window, text="")
+        self.counters_label.pack(fill=tk.X, padx=10, pady=5)
+        self.refresh_performance()
+
+    def refresh_performance(self):
+        if self.performance_window is None or not self.performance_window.winfo_exists():
+            self.performance_window = None
+            return
+        stats, counters = instrumentation.recorder.snapshot()
+        self.performance_tree.delete(*self.performance_tree.get_children())
+        for name, (calls, total, longest, last) in sorted(stats.items(), key=lambda item: -item[1][1]):
+            self.performance_tree.insert("", "end", text=name, values=(
+                calls, f"{total * 1000:.1f}", f"{total / calls * 1000:.2f}", f"{longest * 1000:.1f}", f"{last * 1000:.1f}"
+            ))
+        parts = [
+            f"{name}: {value / 1024:.1f} KB" if name == 'HTTP bytes' else f"{name}: {value:,}"
+            for name, value in sorted(counters.items())
+        ]
+        self.counters_label.config(text=" | ".join(parts) or "No counters yet")
+        self.performance_window.after(PERFORMANCE_REFRESH_MS, self.refresh_performance)
+
+    def export_trace(self):
+        file_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("Chrome trace", "*.json")])
+        if not file_path:
+            return
+        try:
+            instrumentation.recorder.export_trace(file_path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to export trace: {e}")
+            return
+        messagebox.showinfo("Success", "Trace saved. Open it in chrome://tracing or ui.perfetto.dev")
 
     def open_settings(self):
         self.settings_window = tk.Toplevel(self.root)
@@ -479,59 +1281,218 @@ class TSVEditor:
         self.theme_var = tk.StringVar(value="dark")
         ttk.Combobox(self.settings_window, textvariable=self.theme_var, values=["light", "dark"]).grid(row=1, column=1, padx=10, pady=10)
         
-        ttk.Button(self.settings_window, text="Apply", command=self.apply_settings).grid(row=2, column=0, columnspan=2, pady=10)
+        self.virtual_table_var = tk.BooleanVar(value=self.table.enabled)
+        ttk.Checkbutton(self.settings_window, text="Virtual table", variable=self.virtual_table_var).grid(row=2, column=0, padx=10, pady=10)
+
+        self.pyarrow_var = tk.BooleanVar(value=self.load_engine == 'pyarrow')
+        ttk.Checkbutton(
+            self.settings_window, text="Load with pyarrow", variable=self.pyarrow_var,
+            state=tk.NORMAL if tsv_loader.pa_csv is not None else tk.DISABLED
+        ).grid(row=2, column=1, padx=10, pady=10)
+
+        ttk.Label(self.settings_window, text="Cache TTL (hours)").grid(row=3, column=0, padx=10, pady=10)
+        self.cache_ttl_var = tk.StringVar(value=str(self.cache.ttl // 3600))
+        ttk.Entry(self.settings_window, textvariable=self.cache_ttl_var).grid(row=3, column=1, padx=10, pady=10)
+
+        ttk.Label(self.settings_window, text="Cache Size (MB)").grid(row=4, column=0, padx=10, pady=10)
+        self.cache_size_var = tk.StringVar(value=str(self.cache.max_bytes // (1024 * 1024)))
+        ttk.Entry(self.settings_window, textvariable=self.cache_size_var).grid(row=4, column=1, padx=10, pady=10)
+
+        ttk.Label(self.settings_window, text=self.cache.summary()).grid(row=5, column=0, padx=10, pady=10)
+        ttk.Button(self.settings_window, text="Clear Cache", command=self.clear_cache).grid(row=5, column=1, padx=10, pady=10)
+
+        ttk.Label(self.settings_window, text="Terminology Server").grid(row=6, column=0, padx=10, pady=10)
+        self.terminology_url_var = tk.StringVar(value=self.terminology_url)
+        ttk.Entry(self.settings_window, textvariable=self.terminology_url_var, width=40).grid(row=6, column=1, padx=10, pady=10)
+
+        ttk.Label(self.settings_window, text="Validation Transport").grid(row=7, column=0, padx=10, pady=10)
+        self.transport_var = tk.StringVar(value=self.validation_transport)
+        ttk.Combobox(self.settings_window, textvariable=self.transport_var, values=["get", "batch"]).grid(row=7, column=1, padx=10, pady=10)
+
+        ttk.Label(self.settings_window, text="Batch Size").grid(row=8, column=0, padx=10, pady=10)
+        self.batch_size_var = tk.StringVar(value=str(self.validation_batch_size))
+        ttk.Entry(self.settings_window, textvariable=self.batch_size_var).grid(row=8, column=1, padx=10, pady=10)
+
+        ttk.Button(self.settings_window, text="Apply", command=self.apply_settings).grid(row=9, column=0, columnspan=2, pady=10)
 
     def apply_settings(self):
-        font_size = self.font_size_var.get()
+        # Every field is checked before any is applied, so a typo leaves the old settings in place
+        numbers = []
+        for label, var, kind, minimum in (
+            ("Font Size", self.font_size_var, int, 1),
+            ("Cache TTL (hours)", self.cache_ttl_var, float, 0),
+            ("Cache Size (MB)", self.cache_size_var, float, 1),
+            ("Batch Size", self.batch_size_var, int, 1),
+        ):
+            try:
+                value = kind(var.get().strip())
+            except ValueError:
+                value = None
+            if value is None or not minimum <= value < float('inf'):
+                messagebox.showerror("Error", f"{label} must be a number of at least {minimum}", parent=self.settings_window)
+                return
+            numbers.append(value)
+        font_size, cache_ttl, cache_size, batch_size = numbers
         theme = self.theme_var.get()
-        
-        self.txt_cell.config(font=("Helvetica", int(font_size)))
+        if theme not in ("light", "dark"):
+            messagebox.showerror("Error", "Theme must be light or dark", parent=self.settings_window)
+            return
+        if self.transport_var.get() not in ("get", "batch"):
+            messagebox.showerror("Error", "Validation transport must be get or batch", parent=self.settings_window)
+            return
+
+        self.txt_cell.config(font=("Helvetica", font_size))
         sv_ttk.set_theme(theme)
+        self.cache.ttl = int(cache_ttl * 3600)
+        self.cache.max_bytes = int(cache_size * 1024 * 1024)
+        self.terminology_url = self.terminology_url_var.get().rstrip('/')
+        self.load_engine = 'pyarrow' if self.pyarrow_var.get() else 'pandas'
+        self.validation_transport = self.transport_var.get()
+        self.validation_batch_size = batch_size
+        if self.virtual_table_var.get() != self.table.enabled:
+            self.table.enabled = self.virtual_table_var.get()
+            if self.df is not None:
+                self.update_treeview()
         self.settings_window.destroy()
 
-    def start_snomed_search_thread(self):
-        threading.Thread(target=self.search_snomed).start()
+    def clear_cache(self):
+        self.cache.clear()
+        self.update_status_bar()
+
+    def start_snomed_search(self):
+        self.search_snomed(immediate=True)
+
+    def on_snomed_search_key(self, event):
+        if event.keysym == "Return":
+            self.search_snomed(immediate=True)
+        else:
+            self.search_snomed()
 
-    def search_snomed(self):
-        search_term = self.snomed_search_entry.get()
+    def search_snomed(self, immediate=False):
+        # Widgets are read here on the Tk thread; the worker only sees the (term, ecl, backend) query
+        search_term = self.snomed_search_entry.get().strip()
         selected_search_term = self.search_term_var.get()
         ecl = next((term[1] for term in self.search_terms if term[0] == selected_search_term), None)
-        if not search_term or not ecl:
-            messagebox.showwarning("Warning", "Please enter a search term and select a category")
+        backend = self.snomed_backend_var.get()
+        if backend == "Local" and self.description_index is None:
+            if immediate:
+                messagebox.showwarning("Warning", "No local index found. Use Import RF2 to build one from an RF2 Description snapshot.")
             return
-        
-        encoded_search_term = quote(search_term)
-        url = f"https://snowstorm.snomedtools.org/snowstorm/snomed-ct/MAIN/concepts?activeFilter=true&term={encoded_search_term}&ecl={quote(ecl)}&includeLeafFlag=false&form=inferred&offset=0&limit=50"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-        }
-
+        if immediate:
+            if not search_term:
+                messagebox.showwarning("Warning", "Please enter a search term")
+                return
+            self.snomed_typeahead.search_now((search_term, ecl, backend))
+        elif len(search_term) >= MIN_QUERY_LENGTH:
+            self.snomed_typeahead.schedule((search_term, ecl, backend))
+        else:
+            self.snomed_typeahead.cancel()
+            self.snomed_results_listbox.delete(0, tk.END)
+
+    @instrumentation.timed('search_snomed', 'terminology')
+    def fetch_snomed_page(self, query, offset, limit):
+        # Runs on a worker thread
+        search_term, ecl, backend = query
+        if backend == "Local":
+            return self.description_index.search(search_term, offset, limit, accept=self.local_ecl_filter(ecl))
+        return terminology.search_concepts(self.http_session(), search_term, ecl, self.snowstorm_url, self.snomed_branch, offset=offset, limit=limit, cache=self.cache)
+
+    def local_ecl_filter(self, ecl):
+        # Hierarchy constraints are evaluated against the local closure index when one is loaded
+        if self.closure_index is None or not ecl:
+            return None
         try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            response_json = response.json()
-            self.display_snomed_results(response_json)
-        except requests.RequestException as e:
-            messagebox.showerror("Error", f"Error fetching SNOMED-CT concepts: {str(e)}")
-
-    def display_snomed_results(self, results):
-        self.snomed_results_listbox.delete(0, tk.END)
-        for item in results.get('items', []):
-            concept_id = item.get('conceptId')
-            term = item.get('fsn', {}).get('term')
-            if concept_id and term:
-                concept = f"{concept_id} | {term} |"
-                self.snomed_results_listbox.insert(tk.END, concept)
+            return self.closure_index.constraint_filter(ecl)
+        except ValueError:
+            return None
+
+    def import_rf2(self):
+        file_path = filedialog.askopenfilename(filetypes=[
+            ("RF2 Snapshot files", "sct2_Description_*.txt sct2_Relationship_*.txt"),
+            ("Text files", "*.txt")
+        ])
+        if not file_path:
+            return
+
+        file_name = os.path.basename(file_path)
+        if file_name.startswith("sct2_Description"):
+            kind = "descriptions"
+            # The index file is replaced when the build finishes, so release it first
+            if self.description_index is not None:
+                self.description_index.close()
+                self.description_index = None
+            build = lambda on_progress: build_description_index(file_path, default_index_path(), on_progress=on_progress)
+        elif file_name.startswith("sct2_Relationship"):
+            kind = "relationships"
+            build = lambda on_progress: ClosureIndex.build(file_path, on_progress=on_progress)
+        else:
+            messagebox.showwarning("Warning", "Choose an RF2 sct2_Description_* or sct2_Relationship_* snapshot file")
+            return
+
+        def work(job):
+            result = build(job.progress)
+            if isinstance(result, ClosureIndex):
+                result.save()
+            return result
+
+        self.btn_import_rf2.config(state=tk.DISABLED)
+        self.scheduler.submit(
+            work,
+            priority=PRIORITY_BULK,
+            on_progress=lambda count: self.status_bar.config(text=f"Indexing RF2 {kind}: {count:,}"),
+            on_done=lambda result: self.finish_rf2_import(kind, result),
+            on_error=lambda e: self.finish_rf2_import(kind, None, e)
+        )
+
+    def finish_rf2_import(self, kind, result, error=None):
+        self.btn_import_rf2.config(state=tk.NORMAL)
+        if kind == "descriptions":
+            self.description_index = open_description_index()
+        self.update_status_bar()
+        if error is not None:
+            messagebox.showerror("Error", f"Failed to import RF2 {kind}: {error}")
+        elif kind == "descriptions":
+            self.snomed_backend_var.set("Local")
+            messagebox.showinfo("Success", f"Indexed {result:,} descriptions for local search")
+        else:
+            self.closure_index = result
+            messagebox.showinfo("Success", f"Indexed the IS-A hierarchy of {len(self.closure_index.ids):,} concepts")
+
+    def show_snomed_error(self, error):
+        # Type-ahead runs while the user is typing, so failures must not steal focus with a dialog
+        self.status_bar.config(text=f"Error fetching SNOMED-CT concepts: {error}")
+
+    def on_snomed_results_scroll(self, first, last):
+        self.snomed_results_scroll.set(first, last)
+        if float(last) >= 0.9:
+            self.snomed_typeahead.load_more()
+
+    def display_snomed_results(self, results, append=False):
+        if not append:
+            self.snomed_results_listbox.delete(0, tk.END)
+        for concept in concept_lines(results):
+            self.snomed_results_listbox.insert(tk.END, concept)
 
     def insert_snomed_concept(self, event):
         selected_concept = self.snomed_results_listbox.get(self.snomed_results_listbox.curselection())
         cursor_index = self.txt_cell.index(tk.INSERT)
         self.txt_cell.insert(cursor_index, selected_concept)
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="expressiondesigner", description="TermForge expression editor")
+    parser.add_argument("--profile-startup", action="store_true", help="Print how long each startup phase takes")
+    parser.add_argument("--instrument", action="store_true", help="Record timings and counters from startup")
+    parser.add_argument("--trace-file", help="Record from startup and write a Chrome trace here on exit")
+    args = parser.parse_args(argv)
+    if args.instrument or args.trace_file:
+        instrumentation.recorder.enable()
+
+    timer = StartupTimer(STARTED, enabled=args.profile_startup)
+    timer.mark("imports")
     root = tk.Tk()
     root.iconbitmap("img/termforge.ico")
-    TSVEditor(root)
+    timer.mark("tk root")
+    TSVEditor(root, timer, args.trace_file)
     root.mainloop()
 
 if __name__ == "__main__":
@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+# Oldest spans are dropped past this many, so a long session can't grow without bound
+MAX_EVENTS = 200000
+
+
+class Span:
+    # Times one block of work; does nothing unless the recorder was enabled when it started
+    __slots__ = ('recorder', 'name', 'category', 'args', 'start')
+
+    def __init__(self, recorder, name, category, args):
+        self.recorder = recorder
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        if self.recorder.enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.start is not None:
+            if exc_type is not None:
+                self.args = dict(self.args, error=exc_type.__name__)
+            self.recorder.record(self.name, self.category, self.start, time.perf_counter() - self.start, self.args)
+        return False
+
+    def annotate(self, **args):
+        # Adds details only known once the work is done, e.g. a response size
+        if self.start is not None:
+            self.args = dict(self.args, **args)
+
+
+class Recorder:
+    # Opt-in timings and counters for the hot paths. Spans keep per-name totals for
+    # the Performance panel and the raw events for a Chrome trace (chrome://tracing,
+    # Perfetto). Safe to use from worker threads.
+    def __init__(self, max_events=MAX_EVENTS):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.events = deque(maxlen=max_events)
+        self.threads = {}
+        self.stats = {}
+        self.counters = {}
+        self.origin = time.perf_counter()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        with self.lock:
+            self.events.clear()
+            self.stats.clear()
+            self.counters.clear()
+            self.origin = time.perf_counter()
+
+    def span(self, name, category='app', **args):
+        return Span(self, name, category, args)
+
+    def timed(self, name=None, category='app'):
+        # Decorator form of span, named after the function unless told otherwise
+        def decorate(fn):
+            label = name or fn.__name__
+
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with Span(self, label, category, {}):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def record(self, name, category, start, duration, args=None):
+        thread = threading.current_thread()
+        with self.lock:
+            self.threads.setdefault(thread.ident, thread.name)
+            self.events.append((name, category, start, duration, thread.ident, args or None))
+            stats = self.stats.get(name)
+            if stats is None:
+                self.stats[name] = [1, duration, duration, duration]
+            else:
+                stats[0] += 1
+                stats[1] += duration
+                stats[2] = max(stats[2], duration)
+                stats[3] = duration
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        # ({name: (calls, total s, max s, last s)}, {counter: value}) for display
+        with self.lock:
+            return {name: tuple(stats) for name, stats in self.stats.items()}, dict(self.counters)
+
+    def chrome_trace(self):
+        # Complete ("X") events in microseconds, plus thread names so workers are labelled
+        pid = os.getpid()
+        with self.lock:
+            events = list(self.events)
+            threads = dict(self.threads)
+            counters = dict(self.counters)
+            origin = self.origin
+        trace = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+            for tid, name in threads.items()
+        ]
+        for name, category, start, duration, tid, args in events:
+            event = {
+                'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': tid,
+                'ts': round((start - origin) * 1e6, 1), 'dur': round(duration * 1e6, 1)
+            }
+            if args:
+                event['args'] = args
+            trace.append(event)
+        return {'traceEvents': trace, 'displayTimeUnit': 'ms', 'otherData': {'counters': counters}}
+
+    def export_trace(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f, default=str)
+
+
+# Process-wide recorder shared by every module
+recorder = Recorder()
+span = recorder.span
+timed = recorder.timed
+count = recorder.count
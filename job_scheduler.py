@@ -0,0 +1,141 @@
+import heapq
+import itertools
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Lower numbers start first when workers are scarce
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+DEFAULT_WORKERS = 4
+POLL_MS = 50
+
+
+class Job:
+    # Handle given to the work function: it should check cancelled now and then and
+    # may report progress, which reaches on_progress on the Tk thread
+    def __init__(self, job_id, scheduler, priority, work, args, callbacks):
+        self.id = job_id
+        self.scheduler = scheduler
+        self.priority = priority
+        self.work = work
+        self.args = args
+        self.callbacks = callbacks
+        self.state = 'waiting'
+        self.cancelled = threading.Event()
+        self.cancel_hooks = []
+
+    def progress(self, value):
+        self.scheduler.events.put((self.id, 'progress', value))
+
+    def add_cancel_hook(self, hook):
+        # For work that runs its own machinery (e.g. a thread pool) with its own stop switch:
+        # hook is called by cancel() and shutdown(), or right away if the job is already cancelled
+        with self.scheduler.lock:
+            if not self.cancelled.is_set():
+                self.cancel_hooks.append(hook)
+                return
+        hook()
+
+
+class JobScheduler:
+    # Background jobs for a Tk app. At most max_workers run at once on a thread pool and
+    # waiting jobs start in priority order, then submission order. Workers never touch
+    # widgets: progress, results and errors go through a queue that root.after drains,
+    # and each job's callbacks run there, on the Tk thread.
+    def __init__(self, root, max_workers=DEFAULT_WORKERS):
+        self.root = root
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="termforge-job")
+        self.lock = threading.Lock()
+        self.waiting = []
+        self.running = 0
+        self.jobs = {}
+        self.events = queue.Queue()
+        self.ids = itertools.count(1)
+        self.polling = False
+
+    def submit(self, work, *args, priority=PRIORITY_NORMAL, on_done=None, on_error=None, on_progress=None, on_cancel=None):
+        # Runs work(job, *args) on a worker thread and returns the job id
+        job = Job(next(self.ids), self, priority, work, args, (on_done, on_error, on_progress, on_cancel))
+        with self.lock:
+            self.jobs[job.id] = job
+            heapq.heappush(self.waiting, (priority, job.id, job))
+        self.dispatch()
+        if not self.polling:
+            self.polling = True
+            self.root.after(POLL_MS, self.poll)
+        return job.id
+
+    def cancel(self, job_id):
+        # A waiting job never starts; a running one sees job.cancelled and should stop early
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return
+            job.cancelled.set()
+            if job.state == 'waiting':
+                job.state = 'cancelled'
+                self.events.put((job.id, 'cancelled', None))
+            hooks, job.cancel_hooks = job.cancel_hooks, []
+        for hook in hooks:
+            hook()
+
+    def is_active(self, job_id):
+        return job_id in self.jobs
+
+    def dispatch(self):
+        # Only hands the pool as many jobs as it has workers, so priorities decide the order
+        with self.lock:
+            while self.waiting and self.running < self.max_workers:
+                _, _, job = heapq.heappop(self.waiting)
+                if job.state != 'waiting':
+                    continue
+                job.state = 'running'
+                self.running += 1
+                self.executor.submit(self.run, job)
+
+    def run(self, job):
+        try:
+            result = job.work(job, *job.args)
+            event = (job.id, 'cancelled', None) if job.cancelled.is_set() else (job.id, 'done', result)
+        except Exception as e:
+            event = (job.id, 'error', e)
+        with self.lock:
+            self.running -= 1
+        self.events.put(event)
+        self.dispatch()
+
+    def poll(self):
+        try:
+            while True:
+                job_id, kind, value = self.events.get_nowait()
+                job = self.jobs.get(job_id)
+                if job is None:
+                    continue
+                on_done, on_error, on_progress, on_cancel = job.callbacks
+                if kind == 'progress':
+                    if on_progress and not job.cancelled.is_set():
+                        on_progress(value)
+                    continue
+                del self.jobs[job_id]
+                if kind == 'done' and on_done:
+                    on_done(value)
+                elif kind == 'error' and on_error:
+                    on_error(value)
+                elif kind == 'cancelled' and on_cancel:
+                    on_cancel()
+        except queue.Empty:
+            pass
+        finally:
+            # Keep draining even if a callback raised
+            if self.jobs or not self.events.empty():
+                self.root.after(POLL_MS, self.poll)
+            else:
+                self.polling = False
+
+    def shutdown(self):
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,19 @@
+import importlib
+
+
+class LazyModule:
+    # Stands in for a module and imports it on first attribute access, so heavy
+    # dependencies (pandas, requests, pyarrow) stay off the startup path. The real
+    # import goes through importlib, which is safe to trigger from worker threads.
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+def lazy_import(name):
+    return LazyModule(name)
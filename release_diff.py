@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+STATUS_COLUMN = "diff"
+CHANGED_COLUMN = "changed columns"
+OCCURRENCE = "__occurrence"
+
+
+def as_text(series):
+    # Cells as text, with whole floats spelled as integers: a column reads as int64 from one
+    # file and float64 from the other when only one has a blank, and the outer join turns
+    # int columns into floats for unmatched rows. Checked per cell, unlike tsv_loader.as_text,
+    # so 1.5 beside 1.0 still leaves 1.0 comparing equal to 1.
+    text = series.astype(str).astype(object)
+    if pd.api.types.is_float_dtype(series.dtype):
+        values = series.to_numpy(dtype=float, na_value=np.nan)
+        with np.errstate(invalid='ignore'):
+            whole = np.isfinite(values) & (values == np.round(values)) & (np.abs(values) < 2 ** 63)
+        text[whole] = values[whole].astype(np.int64).astype(str)
+    return text.where(series.notna())
+
+
+def comparable(series):
+    # Text for comparing cells across files, with a sentinel for missing values so NaN == NaN
+    return as_text(series).fillna("\0").to_numpy(dtype=object)
+
+
+def diff_frames(old, new, key, include_unchanged=False):
+    # Joins two releases on key (a hash join via merge) and classifies each row as
+    # added, removed, changed or unchanged. Repeated keys are paired in file order.
+    # Returns (diff frame, summary dict).
+    if key not in old.columns or key not in new.columns:
+        raise ValueError(f"Key column '{key}' must exist in both files")
+    compared = [col for col in old.columns if col in new.columns and col != key]
+
+    def keyed(df):
+        frame = df[[key] + compared].copy()
+        # Categoricals from the two files have different categories and cannot be combined
+        for col in compared:
+            if isinstance(frame[col].dtype, pd.CategoricalDtype):
+                frame[col] = frame[col].astype(object)
+        frame[key] = as_text(frame[key]).fillna("")
+        frame[OCCURRENCE] = frame.groupby(key, sort=False).cumcount()
+        return frame
+
+    merged = pd.merge(keyed(old), keyed(new), on=[key, OCCURRENCE], how='outer', suffixes=(" (old)", " (new)"), indicator=True, sort=False)
+    added = (merged['_merge'] == 'right_only').to_numpy()
+    removed = (merged['_merge'] == 'left_only').to_numpy()
+    both = ~(added | removed)
+
+    data = {key: merged[key]}
+    flags = {}
+    any_changed = np.zeros(len(merged), dtype=bool)
+    for col in compared:
+        old_values = merged[f"{col} (old)"]
+        new_values = merged[f"{col} (new)"]
+        changed = both & (comparable(old_values) != comparable(new_values))
+        flags[col] = changed
+        any_changed |= changed
+        # Removed rows only have old values; other rows show the new one with the old kept where it changed
+        data[col] = new_values.where(~removed, old_values)
+        data[f"{col} (old)"] = old_values.where(changed)
+
+    status = np.select([added, removed, any_changed], ["added", "removed", "changed"], default="unchanged")
+    changed_columns = np.full(len(merged), "", dtype=object)
+    for col in compared:
+        separator = np.where(changed_columns != "", ", ", "")
+        changed_columns = np.where(flags[col], changed_columns + separator + col, changed_columns)
+
+    diff = pd.DataFrame(data)
+    diff.insert(1, STATUS_COLUMN, pd.Categorical(status, categories=["added", "removed", "changed", "unchanged"]))
+    diff.insert(2, CHANGED_COLUMN, changed_columns)
+    for col in compared:
+        diff[f"{col} changed"] = flags[col]
+    if not include_unchanged:
+        diff = diff[status != "unchanged"]
+    diff = diff.sort_values([STATUS_COLUMN, key], kind='stable').reset_index(drop=True)
+
+    summary = {
+        "added": int(added.sum()),
+        "removed": int(removed.sum()),
+        "changed": int(any_changed.sum()),
+        "unchanged": int((both & ~any_changed).sum()),
+        "columns only in old": [col for col in old.columns if col not in new.columns],
+        "columns only in new": [col for col in new.columns if col not in old.columns],
+    }
+    return diff, summary
+
+
+def summary_text(summary):
+    text = f"{summary['added']:,} added, {summary['removed']:,} removed, {summary['changed']:,} changed, {summary['unchanged']:,} unchanged"
+    for label in ("columns only in old", "columns only in new"):
+        if summary[label]:
+            text += f" | {label.capitalize()}: {', '.join(summary[label])}"
+    return text
@@ -0,0 +1,180 @@
+import os
+import pickle
+import re
+from array import array
+from bisect import bisect_left
+from collections import deque
+from rf2_index import read_rf2
+from terminology_cache import config_dir
+from scg_parser import parse_expression, canonical_key, SCGSyntaxError
+
+IS_A = "116680003"
+
+# Simple ECL: an optional hierarchy operator and one focus concept
+SIMPLE_ECL_RE = re.compile(r"^\s*(<<|<|>>|>)?\s*(\d+)\s*(?:\|[^|]*\|)?\s*$")
+
+
+def default_closure_path():
+    return os.path.join(config_dir(), 'closure.pickle')
+
+
+class ClosureIndex:
+    # IS-A hierarchy over integer-remapped concept ids. Concept ids live in one
+    # sorted array and parents/children are stored as CSR arrays; descendant
+    # sets are computed on demand as bitsets and cached per focus concept.
+    def __init__(self, ids, parent_offsets, parents, child_offsets, children):
+        self.ids = ids
+        self.parent_offsets = parent_offsets
+        self.parents = parents
+        self.child_offsets = child_offsets
+        self.children = children
+        self.bitsets = {}
+
+    @classmethod
+    def build(cls, relationship_file, on_progress=None):
+        sources = array('q')
+        destinations = array('q')
+        for row in read_rf2(relationship_file):
+            if row.get('active') == '1' and row.get('typeId') == IS_A:
+                sources.append(int(row['sourceId']))
+                destinations.append(int(row['destinationId']))
+                if on_progress and len(sources) % 100000 == 0:
+                    on_progress(len(sources))
+
+        ids = array('q', sorted(set(sources) | set(destinations)))
+        position = {concept_id: i for i, concept_id in enumerate(ids)}
+        child_index = array('i', (position[concept_id] for concept_id in sources))
+        parent_index = array('i', (position[concept_id] for concept_id in destinations))
+        del position
+
+        parent_offsets, parents = cls.csr(len(ids), child_index, parent_index)
+        child_offsets, children = cls.csr(len(ids), parent_index, child_index)
+        if on_progress:
+            on_progress(len(sources))
+        return cls(ids, parent_offsets, parents, child_offsets, children)
+
+    @staticmethod
+    def csr(size, keys, values):
+        offsets = array('i', [0]) * (size + 1)
+        for key in keys:
+            offsets[key + 1] += 1
+        for i in range(size):
+            offsets[i + 1] += offsets[i]
+        filled = array('i', offsets)
+        targets = array('i', [0]) * len(keys)
+        for key, value in zip(keys, values):
+            targets[filled[key]] = value
+            filled[key] += 1
+        return offsets, targets
+
+    def save(self, path=None):
+        path = path or default_closure_path()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path + ".building", 'wb') as f:
+            pickle.dump((self.ids, self.parent_offsets, self.parents, self.child_offsets, self.children), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".building", path)
+
+    @classmethod
+    def load(cls, path=None):
+        with open(path or default_closure_path(), 'rb') as f:
+            return cls(*pickle.load(f))
+
+    def index_of(self, concept_id):
+        concept_id = int(concept_id)
+        i = bisect_left(self.ids, concept_id)
+        if i < len(self.ids) and self.ids[i] == concept_id:
+            return i
+        return None
+
+    def walk(self, start, offsets, targets):
+        seen = bytearray(len(self.ids))
+        queue = deque([start])
+        seen[start] = 1
+        while queue:
+            node = queue.popleft()
+            for target in targets[offsets[node]:offsets[node + 1]]:
+                if not seen[target]:
+                    seen[target] = 1
+                    queue.append(target)
+        return seen
+
+    def descendants_bitset(self, concept_id):
+        # Includes the concept itself; callers clear it for '<'
+        i = self.index_of(concept_id)
+        if i is None:
+            return None
+        if i not in self.bitsets:
+            self.bitsets[i] = self.walk(i, self.child_offsets, self.children)
+        return self.bitsets[i]
+
+    def ancestors(self, concept_id, include_self=False):
+        i = self.index_of(concept_id)
+        if i is None:
+            return set()
+        seen = self.walk(i, self.parent_offsets, self.parents)
+        if not include_self:
+            seen[i] = 0
+        return {self.ids[j] for j in range(len(seen)) if seen[j]}
+
+    def constraint_filter(self, ecl):
+        # Returns a predicate on concept ids for '<', '<<', '>', '>>' or a bare
+        # concept id; raises ValueError for anything else
+        match = SIMPLE_ECL_RE.match(ecl)
+        if not match:
+            raise ValueError(f"Unsupported ECL for local evaluation: {ecl}")
+        operator, focus = match.groups()
+        focus_id = int(focus)
+
+        if operator in ('<', '<<'):
+            bits = self.descendants_bitset(focus_id)
+            if bits is None:
+                return lambda concept_id: False
+            include_self = operator == '<<'
+
+            def accept(concept_id):
+                i = self.index_of(concept_id)
+                return i is not None and bool(bits[i]) and (include_self or self.ids[i] != focus_id)
+            return accept
+
+        if operator in ('>', '>>'):
+            ancestors = self.ancestors(focus_id, include_self=operator == '>>')
+            return lambda concept_id: int(concept_id) in ancestors
+
+        return lambda concept_id: int(concept_id) == focus_id
+
+    def expression_filter(self, ecl):
+        # Like constraint_filter, but accepts post-coordinated expressions when all their focus concepts match
+        accept = self.constraint_filter(ecl)
+
+        def accept_expression(text):
+            try:
+                expression = parse_expression(str(text).strip())
+            except SCGSyntaxError:
+                return False
+            return all(accept(reference.concept_id) for reference in expression.focus)
+        return accept_expression
+
+
+def scope_answers(series, closure, ecl):
+    # {distinct stripped value: in scope}, each canonical expression evaluated once
+    accept = closure.expression_filter(ecl)
+    values = series.dropna().astype(str).str.strip()
+    answers = {}
+    by_key = {}
+    for value in values.unique():
+        if value:
+            key = canonical_key(value)
+            if key not in by_key:
+                by_key[key] = accept(value)
+            answers[value] = by_key[key]
+    return answers
+
+
+def open_closure_index(path=None):
+    path = path or default_closure_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        return ClosureIndex.load(path)
+    except (OSError, pickle.UnpicklingError, EOFError, TypeError):
+        return None
@@ -0,0 +1,119 @@
+import os
+import re
+import sqlite3
+import threading
+from terminology_cache import config_dir
+
+FSN_TYPE = "900000000000003001"
+BUILD_BATCH = 50000
+
+
+def default_index_path():
+    return os.path.join(config_dir(), 'descriptions.sqlite')
+
+
+def read_rf2(file_path):
+    # RF2 files are UTF-8, tab separated, with a header row and no quoting
+    with open(file_path, encoding='utf-8') as f:
+        header = f.readline().rstrip('\r\n').split('\t')
+        for line in f:
+            yield dict(zip(header, line.rstrip('\r\n').split('\t')))
+
+
+def build_description_index(description_file, index_path=None, on_progress=None):
+    # Builds an FTS5 index over the active descriptions of an RF2 Snapshot
+    # sct2_Description_*.txt file, plus a conceptId -> FSN table for display
+    index_path = index_path or default_index_path()
+    os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+    building_path = index_path + ".building"
+    if os.path.exists(building_path):
+        os.remove(building_path)
+
+    conn = sqlite3.connect(building_path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("CREATE VIRTUAL TABLE descriptions USING fts5(term, concept_id UNINDEXED, tokenize='unicode61', prefix='2 3')")
+    conn.execute("CREATE TABLE fsn (concept_id TEXT PRIMARY KEY, term TEXT NOT NULL) WITHOUT ROWID")
+
+    count = 0
+    terms = []
+    fsns = []
+    for row in read_rf2(description_file):
+        if row.get('active') != '1':
+            continue
+        terms.append((row['term'], row['conceptId']))
+        if row['typeId'] == FSN_TYPE:
+            fsns.append((row['conceptId'], row['term']))
+        count += 1
+        if len(terms) >= BUILD_BATCH:
+            conn.executemany("INSERT INTO descriptions (term, concept_id) VALUES (?, ?)", terms)
+            conn.executemany("INSERT OR REPLACE INTO fsn (concept_id, term) VALUES (?, ?)", fsns)
+            terms, fsns = [], []
+            if on_progress:
+                on_progress(count)
+    conn.executemany("INSERT INTO descriptions (term, concept_id) VALUES (?, ?)", terms)
+    conn.executemany("INSERT OR REPLACE INTO fsn (concept_id, term) VALUES (?, ?)", fsns)
+    conn.execute("INSERT INTO descriptions (descriptions) VALUES ('optimize')")
+    conn.commit()
+    conn.close()
+
+    os.replace(building_path, index_path)
+    if on_progress:
+        on_progress(count)
+    return count
+
+
+def match_query(term):
+    # Every word must match as a prefix, like Snowstorm's term filter
+    words = re.findall(r"\w+", term.lower())
+    return " ".join(f'"{word}"*' for word in words)
+
+
+class DescriptionIndex:
+    # Read side of the local index; returns results shaped like Snowstorm's
+    # /concepts response so the search panel can render either backend
+    def __init__(self, index_path=None):
+        self.path = index_path or default_index_path()
+        self.conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        self.lock = threading.Lock()
+
+    def search(self, term, offset=0, limit=50, accept=None):
+        # accept optionally filters concept ids, e.g. by an ECL constraint
+        query = match_query(term)
+        if not query:
+            return {'items': [], 'total': 0}
+
+        items = []
+        seen = set()
+        skipped = 0
+        with self.lock:
+            # Rows are consumed lazily, so the scan stops as soon as the page is full
+            cursor = self.conn.execute(
+                "SELECT d.concept_id, f.term FROM descriptions d JOIN fsn f ON f.concept_id = d.concept_id "
+                "WHERE descriptions MATCH ?", (query,)
+            )
+            for concept_id, fsn in cursor:
+                if concept_id in seen:
+                    continue
+                seen.add(concept_id)
+                if accept is not None and not accept(concept_id):
+                    continue
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                items.append({'conceptId': concept_id, 'fsn': {'term': fsn}})
+                if len(items) >= limit:
+                    break
+            cursor.close()
+        return {'items': items}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def open_description_index(index_path=None):
+    index_path = index_path or default_index_path()
+    if not os.path.exists(index_path):
+        return None
+    return DescriptionIndex(index_path)
@@ -0,0 +1,255 @@
+import hashlib
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# AST for SNOMED CT Compositional Grammar expressions
+Expression = namedtuple('Expression', 'definition_status focus refinement')
+ConceptReference = namedtuple('ConceptReference', 'concept_id term')
+Refinement = namedtuple('Refinement', 'attributes groups')
+Attribute = namedtuple('Attribute', 'name value')
+ConcreteValue = namedtuple('ConcreteValue', 'kind value')
+
+# Whitespace is skipped as part of every token; the last group catches anything unexpected
+TOKEN_RE = re.compile(r"""\s*(?:
+    (?P<definition_status>===|<<<)
+  | (?P<sctid>\d+)
+  | \|(?P<term>[^|]*)\|
+  | \#(?P<number>-?\d+(?:\.\d+)?)
+  | "(?P<string>(?:[^"\\]|\\.)*)"
+  | (?P<boolean>true|false)
+  | (?P<operator>[:=+,{}()])
+  | (?P<unknown>\S)
+)""", re.VERBOSE)
+
+_VERHOEFF_D = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9), (1, 2, 3, 4, 0, 6, 7, 8, 9, 5),
+    (2, 3, 4, 0, 1, 7, 8, 9, 5, 6), (3, 4, 0, 1, 2, 8, 9, 5, 6, 7),
+    (4, 0, 1, 2, 3, 9, 5, 6, 7, 8), (5, 9, 8, 7, 6, 0, 4, 3, 2, 1),
+    (6, 5, 9, 8, 7, 1, 0, 4, 3, 2), (7, 6, 5, 9, 8, 2, 1, 0, 4, 3),
+    (8, 7, 6, 5, 9, 3, 2, 1, 0, 4), (9, 8, 7, 6, 5, 4, 3, 2, 1, 0)
+)
+_VERHOEFF_P = (
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9), (1, 5, 7, 6, 2, 8, 3, 0, 9, 4),
+    (5, 8, 0, 3, 7, 9, 6, 1, 4, 2), (8, 9, 1, 6, 0, 4, 3, 5, 2, 7),
+    (9, 4, 5, 3, 1, 2, 6, 8, 7, 0), (4, 2, 8, 6, 5, 7, 3, 9, 0, 1),
+    (2, 7, 9, 3, 8, 0, 6, 4, 1, 5), (7, 0, 4, 6, 9, 1, 3, 2, 5, 8)
+)
+
+
+class SCGSyntaxError(ValueError):
+    def __init__(self, message, position):
+        super().__init__(f"{message} at position {position}")
+        self.message = message
+        self.position = position
+
+
+@lru_cache(maxsize=65536)
+def valid_sctid(sctid):
+    # 6-18 digits, no leading zero and a correct Verhoeff check digit
+    if not 6 <= len(sctid) <= 18 or sctid[0] == '0':
+        return False
+    check = 0
+    for i, digit in enumerate(reversed(sctid)):
+        check = _VERHOEFF_D[check][_VERHOEFF_P[i % 8][int(digit)]]
+    return check == 0
+
+
+class _Parser:
+    def __init__(self, text):
+        self.text = text
+        self.tokens = []
+        for match in TOKEN_RE.finditer(text):
+            kind = match.lastgroup
+            self.tokens.append((kind, match.group(kind), match.start(kind)))
+        # Two end markers so one-token lookahead never runs off the list
+        end = ('end', '', len(text.rstrip()))
+        self.tokens.extend((end, end))
+        self.index = 0
+
+    def peek(self):
+        return self.tokens[self.index]
+
+    def next(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def fail(self, message, token=None):
+        raise SCGSyntaxError(message, (token or self.peek())[2])
+
+    def at(self, operator, ahead=0):
+        token = self.tokens[self.index + ahead]
+        return token[1] == operator and token[0] == 'operator'
+
+    def accept(self, operator):
+        if self.at(operator):
+            self.index += 1
+            return True
+        return False
+
+    def expect(self, operator):
+        if not self.accept(operator):
+            kind, value, _ = self.peek()
+            self.fail(f"Expected '{operator}' but found {value!r}" if kind != 'end' else f"Expected '{operator}' but reached the end")
+
+    def parse(self):
+        definition_status = None
+        if self.peek()[0] == 'definition_status':
+            definition_status = self.next()[1]
+        expression = self.sub_expression(definition_status)
+        if self.peek()[0] != 'end':
+            self.fail(f"Unexpected {self.peek()[1]!r}")
+        return expression
+
+    def sub_expression(self, definition_status=None):
+        focus = [self.concept_reference()]
+        while self.accept('+'):
+            focus.append(self.concept_reference())
+        refinement = None
+        if self.accept(':'):
+            refinement = self.refinement()
+        return Expression(definition_status, tuple(focus), refinement)
+
+    def concept_reference(self):
+        token = self.next()
+        kind, value, _ = token
+        if kind != 'sctid':
+            self.fail("Expected a concept id" if kind != 'end' else "Expected a concept id but reached the end", token)
+        if not valid_sctid(value):
+            self.fail(f"Invalid concept id {value}", token)
+        term = None
+        if self.peek()[0] == 'term':
+            term = self.next()[1].strip()
+        return ConceptReference(value, term)
+
+    def refinement(self):
+        attributes = []
+        groups = []
+        if self.at('{'):
+            groups.append(self.attribute_group())
+        else:
+            attributes = self.attribute_set()
+        # Further groups may follow, optionally separated by commas
+        while self.at('{') or (self.at(',') and self.at('{', 1)):
+            self.accept(',')
+            groups.append(self.attribute_group())
+        return Refinement(tuple(attributes), tuple(groups))
+
+    def attribute_group(self):
+        self.expect('{')
+        attributes = self.attribute_set()
+        self.expect('}')
+        return tuple(attributes)
+
+    def attribute_set(self):
+        attributes = [self.attribute()]
+        while self.at(',') and not self.at('{', 1):
+            self.index += 1
+            attributes.append(self.attribute())
+        return attributes
+
+    def attribute(self):
+        name = self.concept_reference()
+        self.expect('=')
+        return Attribute(name, self.attribute_value())
+
+    def attribute_value(self):
+        kind, value, _ = self.peek()
+        if kind == 'sctid':
+            return self.concept_reference()
+        if kind in ('number', 'string', 'boolean'):
+            self.index += 1
+            return ConcreteValue(kind, value)
+        if self.accept('('):
+            expression = self.sub_expression()
+            self.expect(')')
+            return expression
+        self.fail("Expected an attribute value" if kind != 'end' else "Expected an attribute value but reached the end")
+
+
+@lru_cache(maxsize=200000)
+def _parse_cached(text):
+    # lru_cache does not remember exceptions, so errors are cached as (message, position);
+    # a cached exception would keep its traceback and grow it with every re-raise
+    try:
+        return _Parser(text).parse(), None
+    except SCGSyntaxError as e:
+        return None, (e.message, e.position)
+
+
+def parse_expression(text):
+    expression, error = _parse_cached(text)
+    if error is not None:
+        raise SCGSyntaxError(*error)
+    return expression
+
+
+def syntax_error(text):
+    # A fresh SCGSyntaxError for a malformed expression, or None when it parses
+    error = _parse_cached(text)[1]
+    return SCGSyntaxError(*error) if error is not None else None
+
+
+def concept_ids(expression):
+    # Every concept id referenced anywhere in an AST
+    ids = [reference.concept_id for reference in expression.focus]
+    if expression.refinement is not None:
+        attributes = list(expression.refinement.attributes)
+        for group in expression.refinement.groups:
+            attributes.extend(group)
+        for attribute in attributes:
+            ids.append(attribute.name.concept_id)
+            if isinstance(attribute.value, ConceptReference):
+                ids.append(attribute.value.concept_id)
+            elif isinstance(attribute.value, Expression):
+                ids.extend(concept_ids(attribute.value))
+    return ids
+
+
+def _canonical(expression):
+    # Terms and whitespace are dropped; focus concepts, attributes and groups are sorted
+    focus = "+".join(sorted({reference.concept_id for reference in expression.focus}, key=int))
+    text = focus
+    if expression.refinement is not None:
+        parts = sorted(_canonical_attribute(attribute) for attribute in expression.refinement.attributes)
+        groups = sorted("{" + ",".join(sorted(_canonical_attribute(attribute) for attribute in group)) + "}" for group in expression.refinement.groups)
+        text += ":" + ",".join(parts + groups)
+    if expression.definition_status == '<<<':
+        text = '<<<' + text
+    return text
+
+
+def _canonical_attribute(attribute):
+    value = attribute.value
+    if isinstance(value, ConceptReference):
+        rendered = value.concept_id
+    elif isinstance(value, Expression):
+        rendered = f"({_canonical(value)})"
+    elif value.kind == 'number':
+        rendered = f"#{value.value}"
+    elif value.kind == 'string':
+        rendered = f'"{value.value}"'
+    else:
+        rendered = value.value
+    return f"{attribute.name.concept_id}={rendered}"
+
+
+@lru_cache(maxsize=200000)
+def canonical_form(text):
+    # Normal form used to recognise the same expression written differently, or None
+    # if it does not parse. '===' is the default definition status and is left out.
+    expression, error = _parse_cached(text.strip())
+    if error is not None:
+        return None
+    return _canonical(expression)
+
+
+def canonical_key(text):
+    # Canonical form, falling back to the whitespace-normalized text for malformed input
+    form = canonical_form(text)
+    return form if form is not None else " ".join(text.split())
+
+
+def expression_hash(text):
+    return hashlib.blake2b(canonical_key(text).encode('utf-8'), digest_size=8).hexdigest()
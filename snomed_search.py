@@ -0,0 +1,107 @@
+from job_scheduler import PRIORITY_INTERACTIVE
+
+DEFAULT_DELAY_MS = 300
+DEFAULT_PAGE_SIZE = 50
+MIN_QUERY_LENGTH = 3
+
+
+def concept_lines(results):
+    # 'conceptId | FSN |' strings for a Snowstorm-shaped /concepts response
+    lines = []
+    for item in results.get('items', []):
+        concept_id = item.get('conceptId')
+        term = item.get('fsn', {}).get('term')
+        if concept_id and term:
+            lines.append(f"{concept_id} | {term} |")
+    return lines
+
+
+class SnomedTypeAhead:
+    # Debounced type-ahead search. Keystrokes only (re)arm a timer, a single request
+    # runs at a time as an interactive job, and responses for superseded queries are
+    # dropped when the scheduler hands them back on the Tk thread.
+    def __init__(self, scheduler, fetch, on_results, on_error, delay=DEFAULT_DELAY_MS, page_size=DEFAULT_PAGE_SIZE):
+        self.scheduler = scheduler
+        self.root = scheduler.root
+        self.fetch = fetch
+        self.on_results = on_results
+        self.on_error = on_error
+        self.delay = delay
+        self.page_size = page_size
+        self.generation = 0
+        self.after_id = None
+        self.in_flight = False
+        self.queued = None
+        self.query = None
+        self.offset = 0
+        self.exhausted = True
+
+    def schedule(self, query):
+        # Every new query makes all older requests stale, even ones already on the wire
+        self.generation += 1
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+        self.after_id = self.root.after(self.delay, self.start, self.generation, query)
+
+    def search_now(self, query):
+        self.generation += 1
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+        self.start(self.generation, query)
+
+    def cancel(self):
+        self.generation += 1
+        self.queued = None
+        self.query = None
+        if self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+
+    def start(self, generation, query):
+        self.after_id = None
+        self.query = query
+        self.offset = 0
+        self.exhausted = False
+        self.submit(generation, query, 0)
+
+    def load_more(self):
+        # Called as the results list scrolls near its end. While a new query waits out the
+        # debounce, self.query is still the old one and the generation already the new one.
+        if self.query is None or self.exhausted or self.in_flight or self.queued or self.after_id is not None:
+            return
+        self.submit(self.generation, self.query, self.offset)
+
+    def submit(self, generation, query, offset):
+        if self.in_flight:
+            # Only the newest waiting request keeps the slot
+            self.queued = (generation, query, offset)
+            return
+        self.in_flight = True
+        self.scheduler.submit(
+            self.worker, generation, query, offset, priority=PRIORITY_INTERACTIVE,
+            on_done=self.finished, on_error=lambda e: self.finished((generation, offset, None, e))
+        )
+
+    def worker(self, job, generation, query, offset):
+        try:
+            return generation, offset, self.fetch(query, offset, self.page_size), None
+        except Exception as e:
+            return generation, offset, None, e
+
+    def finished(self, response):
+        generation, offset, result, error = response
+        self.in_flight = False
+        if generation == self.generation:
+            if error is not None:
+                self.exhausted = True
+                self.on_error(error)
+            else:
+                items = result.get('items', [])
+                self.offset = offset + len(items)
+                total = result.get('total')
+                self.exhausted = len(items) < self.page_size or (total is not None and self.offset >= total)
+                self.on_results(result, offset > 0)
+
+        queued, self.queued = self.queued, None
+        if queued is not None and queued[0] == self.generation:
+            self.submit(*queued)
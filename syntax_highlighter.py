@@ -1,30 +1,152 @@
 import re
+from collections import namedtuple
+from scg_parser import syntax_error
+import instrumentation
 
-def highlight_snomed_expression(text_widget, expression):
-  # Clear existing tags
-  for tag in text_widget.tag_names():
-    text_widget.tag_remove(tag, "1.0", "end")
-
-  # Define regex patterns for different components
-  patterns = {
-    'definitionStatus': (r'(===|<<<)', 'definition_status'),
-    'conceptReference': (r'(\d+ \|[^|]+\|)', 'concept_reference'),
-    'attribute': (r'(\d+ \|[^|]+\| = \d+ \|[^|]+\|)', 'attribute'),
-    'focusConcept': (r'(\d+ \|[^|]+\|(\s*\+\s*\d+ \|[^|]+\|)*)', 'focus_concept'),
-    'refinement': (r': (\d+ \|[^|]+\| = \d+ \|[^|]+\|)', 'refinement')
-  }
-
-  # Apply tags to highlight the text
-  for pattern, tag in patterns.values():
-    for match in re.finditer(pattern, expression):
-      start, end = match.span()
-      start_idx = str(start)
-      end_idx = str(end)
-      text_widget.tag_add(tag, start_idx, end_idx)
-
-  # Define tag styles
-  text_widget.tag_config('definition_status', foreground='blue', font=('Helvetica', 10, 'bold'))
-  text_widget.tag_config('concept_reference', foreground='green', font=('Helvetica', 10, 'italic'))
-  text_widget.tag_config('attribute', foreground='red', font=('Helvetica', 10, 'underline'))
-  text_widget.tag_config('focus_concept', foreground='purple', font=('Helvetica', 10, 'bold'))
-  text_widget.tag_config('refinement', foreground='orange', font=('Helvetica', 10, 'italic'))
\ No newline at end of file
+Token = namedtuple('Token', 'kind start end text')
+
+# One precompiled scanner; every character falls into exactly one token
+TOKEN_RE = re.compile(r"""
+    (?P<definition_status>===|<<<)
+  | (?P<concept>\d+(?:\s*\|[^|]*\|)?)
+  | (?P<concrete_value>\#-?\d+(?:\.\d+)?|"[^"]*")
+  | (?P<operator>[:=+,{}()])
+  | (?P<whitespace>\s+)
+  | (?P<error>.)
+""", re.VERBOSE | re.DOTALL)
+
+# Scanner state is the mode of each open nesting level: 'focus' before ':',
+# 'name' where an attribute is expected and 'value' after '='
+INITIAL_STATE = ('focus',)
+
+HIGHLIGHT_TAGS = {
+  'definition_status': {'foreground': 'blue', 'font': ('Helvetica', 10, 'bold')},
+  'concept_reference': {'foreground': 'green', 'font': ('Helvetica', 10, 'italic')},
+  'attribute': {'foreground': 'red', 'font': ('Helvetica', 10, 'underline')},
+  'focus_concept': {'foreground': 'pink', 'font': ('Helvetica', 10, 'bold')},
+  'refinement': {'foreground': 'orange', 'font': ('Helvetica', 10, 'italic')},
+}
+SYNTAX_ERROR_TAG = 'syntax_error'
+
+
+def scan(expression, state=INITIAL_STATE):
+  # Returns typed tokens with offsets plus the state at the end of the text.
+  # Concepts are typed by where they sit: focus concept, attribute name or value.
+  tokens = []
+  stack = list(state)
+  for match in TOKEN_RE.finditer(expression):
+    kind = match.lastgroup
+    text = match.group()
+    if kind == 'concept':
+      mode = stack[-1]
+      if mode == 'name':
+        kind = 'attribute'
+      elif mode == 'value':
+        kind = 'refinement'
+      elif len(stack) > 1:
+        kind = 'concept_reference'
+      else:
+        kind = 'focus_concept'
+    elif kind == 'concrete_value':
+      kind = 'refinement'
+    elif kind == 'operator':
+      if text in ':,{}':
+        stack[-1] = 'name'
+      elif text == '=':
+        stack[-1] = 'value'
+      elif text == '(':
+        stack.append('focus')
+      elif text == ')' and len(stack) > 1:
+        stack.pop()
+    tokens.append(Token(kind, match.start(), match.end(), text))
+  return tokens, tuple(stack)
+
+
+def tokenize(expression):
+  return scan(expression)[0]
+
+
+def configure_tags(text_widget):
+  for tag, style in HIGHLIGHT_TAGS.items():
+    text_widget.tag_config(tag, **style)
+  text_widget.tag_config(SYNTAX_ERROR_TAG, background='#5c1f1f')
+
+
+class LiveHighlighter:
+  # Re-highlights a Text widget as it is edited. Only lines that changed are
+  # re-scanned, continuing past them until the scanner state matches what the
+  # following line already started with.
+  def __init__(self, text_widget):
+    self.widget = text_widget
+    self.lines = [""]
+    self.states = [INITIAL_STATE, INITIAL_STATE]
+    self.after_id = None
+    configure_tags(text_widget)
+    text_widget.bind("<<Modified>>", self.on_modified, add="+")
+
+  def on_modified(self, event):
+    if not self.widget.edit_modified():
+      return
+    self.widget.edit_modified(False)
+    if self.after_id is None:
+      self.after_id = self.widget.after_idle(self.update)
+
+  def highlight_all(self):
+    self.lines = []
+    self.states = [INITIAL_STATE]
+    self.update()
+
+  @instrumentation.timed('highlight lines', 'ui')
+  def update(self):
+    self.after_id = None
+    old_lines = self.lines
+    old_states = self.states
+    new_lines = self.widget.get("1.0", "end-1c").split("\n")
+
+    limit = min(len(old_lines), len(new_lines))
+    prefix = 0
+    while prefix < limit and old_lines[prefix] == new_lines[prefix]:
+      prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old_lines[-1 - suffix] == new_lines[-1 - suffix]:
+      suffix += 1
+    changed_end = len(new_lines) - suffix
+
+    # states[n] is the scanner state at the start of line n
+    states = old_states[:prefix + 1]
+    state = states[prefix]
+    line = prefix
+    while line < len(new_lines):
+      if line >= changed_end:
+        old_line = line - len(new_lines) + len(old_lines)
+        if old_states[old_line] == state:
+          states.extend(old_states[old_line + 1:])
+          break
+      state = self.tag_line(line, new_lines[line], state)
+      states.append(state)
+      line += 1
+
+    self.lines = new_lines
+    self.states = states
+    self.mark_syntax_error()
+
+  def mark_syntax_error(self):
+    # The parser's memoized result marks everything from the first syntax error onwards
+    self.widget.tag_remove(SYNTAX_ERROR_TAG, "1.0", "end")
+    text = "\n".join(self.lines)
+    if not text.strip():
+      return
+    error = syntax_error(text)
+    if error is not None:
+      start = min(error.position, max(len(text.rstrip()) - 1, 0))
+      self.widget.tag_add(SYNTAX_ERROR_TAG, f"1.0 + {start} chars", "end-1c")
+
+  def tag_line(self, line, text, state):
+    row = line + 1
+    for tag in HIGHLIGHT_TAGS:
+      self.widget.tag_remove(tag, f"{row}.0", f"{row}.end")
+    tokens, state = scan(text, state)
+    for token in tokens:
+      if token.kind in HIGHLIGHT_TAGS:
+        self.widget.tag_add(token.kind, f"{row}.{token.start}", f"{row}.{token.end}")
+    return state
@@ -0,0 +1,86 @@
+import re
+import numpy as np
+import pandas as pd
+from tsv_loader import is_text_column, is_category_column
+
+
+def pattern_source(pattern, regex=False, case=True):
+    # Literal patterns are escaped so both modes run through the same vectorized regex path.
+    # Returns (regex source, flags); the .str methods of arrow-backed strings ignore the
+    # flags of a compiled pattern, so they are given these instead.
+    return (pattern if regex else re.escape(pattern)), (0 if case else re.IGNORECASE)
+
+
+def compile_pattern(pattern, regex=False, case=True):
+    source, flags = pattern_source(pattern, regex, case)
+    return re.compile(source, flags)
+
+
+def string_cells(series):
+    # Object columns can hold numbers next to text; only the strings are searched
+    return np.fromiter((isinstance(value, str) for value in series), dtype=bool, count=len(series))
+
+
+def searchable_columns(df):
+    return [col for col in df.columns if is_text_column(df[col]) or is_category_column(df[col])]
+
+
+def match_counts(df, columns, pattern, regex=False, case=True):
+    # Preview: {column: (matching rows, total matches)}
+    source, flags = pattern_source(pattern, regex, case)
+    counts = {}
+    for col in columns:
+        series = df[col]
+        if is_category_column(series):
+            # Only the distinct categories are scanned, weighted by how often each occurs
+            categories = pd.Series(series.cat.categories.astype(str))
+            per_category = categories.str.count(source, flags=flags).to_numpy()
+            frequency = np.bincount(series.cat.codes[series.cat.codes >= 0], minlength=len(categories))
+            counts[col] = (int(frequency[per_category > 0].sum()), int((per_category * frequency).sum()))
+        else:
+            texts = series[string_cells(series)]
+            per_row = texts.str.count(source, flags=flags) if len(texts) else pd.Series(dtype=float)
+            counts[col] = (int((per_row > 0).sum()), int(per_row.sum()))
+    return counts
+
+
+def replace_in_columns(df, columns, pattern, replacement, regex=False, case=True):
+    # Computes every replacement first and then assigns them as one batch.
+    # Returns ({column: previous Series}, positions of the rows that changed).
+    compiled = compile_pattern(pattern, regex, case)
+    if not regex:
+        replacement = replacement.replace('\\', '\\\\')
+    new_columns = {}
+    changed = np.zeros(len(df), dtype=bool)
+    for col in columns:
+        series = df[col]
+        if is_category_column(series):
+            categories = pd.Series(series.cat.categories.astype(str))
+            replaced = categories.str.replace(compiled, replacement, regex=True)
+            touched = np.flatnonzero((replaced != categories).to_numpy())
+            if len(touched) == 0:
+                continue
+            mask = series.cat.codes.isin(touched).to_numpy()
+            mapping = dict(zip(series.cat.categories, replaced))
+            new_columns[col] = series.astype(object).map(mapping).where(series.notna()).astype('category')
+        else:
+            # .str would turn numbers in an object column into NaN, so only string cells
+            # are replaced and the rest are left as they are
+            strings = string_cells(series)
+            texts = series[strings]
+            replaced = texts.str.replace(compiled, replacement, regex=True)
+            differs = (replaced != texts).to_numpy()
+            if not differs.any():
+                continue
+            rows = np.flatnonzero(strings)[differs]
+            values = series.copy()
+            values.iloc[rows] = replaced[differs].to_numpy()
+            new_columns[col] = values
+            mask = np.zeros(len(df), dtype=bool)
+            mask[rows] = True
+        changed |= mask
+
+    old_columns = {col: df[col] for col in new_columns}
+    for col, values in new_columns.items():
+        df[col] = values
+    return old_columns, np.flatnonzero(changed)
@@ -0,0 +1,175 @@
+import argparse
+import sys
+import terminology
+import tsv_loader
+import exporters
+import release_diff
+from terminology_cache import open_cache
+from snomed_search import concept_lines
+from rf2_index import open_description_index
+from rf2_closure import open_closure_index
+
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def read_tsv_chunks(file_path, chunksize):
+    with open(file_path, 'rb') as f:
+        yield from tsv_loader.read_chunks(f, 'pandas', chunksize)
+
+
+def output_format(args):
+    # (format, compression) from --format and the output extension, e.g. out.csv.gz
+    if args.output == '-':
+        return args.format or 'tsv', None
+    export_format, compression = exporters.path_format(args.output)
+    return args.format or export_format, compression
+
+
+def validate(args):
+    # Streams the input chunk by chunk: each chunk's distinct codes are validated
+    # through the shared pool and the chunk is written out with a status column
+    cache = None if args.no_cache else open_cache()
+    validator = terminology.ColumnValidator(
+        args.server, max_workers=args.workers, cache=cache, version=args.version,
+        transport=args.transport, batch_size=args.batch_size
+    )
+    status_col = args.status_column or f"{args.column} validation"
+    rows = 0
+    invalid = 0
+    with exporters.ChunkWriter(args.output, *output_format(args)) as writer:
+        for chunk in read_tsv_chunks(args.input, args.chunksize):
+            if args.column not in chunk.columns:
+                log(f"Column '{args.column}' not found in {args.input}")
+                return 2
+            results = validator.run(terminology.distinct_codes(chunk[args.column]))
+            chunk[status_col] = terminology.status_column(chunk[args.column], results)
+            writer.write(chunk)
+            rows += len(chunk)
+            statuses = chunk[status_col]
+            invalid += int(((statuses != "valid") & (statuses != "")).sum())
+            log(f"Validated {rows:,} rows")
+
+    if cache is not None:
+        log(cache.summary())
+    log(f"{invalid:,} rows not valid")
+    return 1 if args.fail_on_invalid and invalid else 0
+
+
+def search(args):
+    if args.local:
+        index = open_description_index()
+        if index is None:
+            log("No local description index; import an RF2 Description snapshot in the GUI first")
+            return 2
+        closure = open_closure_index()
+        accept = None
+        if closure is not None and args.ecl:
+            try:
+                accept = closure.constraint_filter(args.ecl)
+            except ValueError as e:
+                log(str(e))
+        results = index.search(args.term, limit=args.limit, accept=accept)
+    else:
+        results = terminology.search_concepts(
+            terminology.create_session(), args.term, args.ecl, args.server, args.branch,
+            limit=args.limit, cache=None if args.no_cache else open_cache()
+        )
+    for line in concept_lines(results):
+        print(line)
+    return 0
+
+
+def convert(args):
+    export_format, compression = output_format(args)
+    if export_format in exporters.COLUMNAR_FORMATS:
+        # Independently parsed chunks can disagree on column types, which a single
+        # Parquet/Feather schema cannot hold, so columnar output is written from the whole table
+        exporters.export_frame(tsv_loader.load_tsv_chunked(args.input, chunksize=args.chunksize), args.output, export_format)
+        return 0
+    rows = 0
+    with exporters.open_writer(args.output, export_format, compression) as writer:
+        for chunk in read_tsv_chunks(args.input, args.chunksize):
+            writer.write(chunk)
+            rows += len(chunk)
+    log(f"Converted {rows:,} rows")
+    return 0
+
+
+def diff(args):
+    old = tsv_loader.load_tsv_chunked(args.old, chunksize=args.chunksize)
+    new = tsv_loader.load_tsv_chunked(args.new, chunksize=args.chunksize)
+    try:
+        result, summary = release_diff.diff_frames(old, new, args.key, include_unchanged=args.include_unchanged)
+    except ValueError as e:
+        log(str(e))
+        return 2
+    export_format, compression = output_format(args)
+    exporters.export_frame(result, args.output, export_format, compression)
+    log(release_diff.summary_text(summary))
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="termforge", description="Headless TermForge validation, search and conversion")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    validate_parser = subparsers.add_parser("validate", help="Validate a column of a TSV against a FHIR terminology server")
+    validate_parser.add_argument("input", help="TSV file to read")
+    validate_parser.add_argument("--column", required=True, help="Column holding the codes or expressions")
+    validate_parser.add_argument("--output", default="-", help="Output file, or - for stdout")
+    validate_parser.add_argument("--format", choices=exporters.STREAMING_FORMATS, help="Output format (default: from the output extension)")
+    validate_parser.add_argument("--status-column", help="Name of the added status column")
+    validate_parser.add_argument("--workers", type=int, default=terminology.DEFAULT_WORKERS)
+    validate_parser.add_argument("--transport", choices=["get", "batch"], default="get")
+    validate_parser.add_argument("--batch-size", type=int, default=terminology.DEFAULT_BATCH_SIZE)
+    validate_parser.add_argument("--server", default=terminology.ONTOSERVER_URL, help="FHIR base URL")
+    validate_parser.add_argument("--version", help="SNOMED CT version URI")
+    validate_parser.add_argument("--chunksize", type=int, default=tsv_loader.CHUNK_ROWS)
+    validate_parser.add_argument("--no-cache", action="store_true", help="Skip the on-disk response cache")
+    validate_parser.add_argument("--fail-on-invalid", action="store_true", help="Exit with status 1 if any row is not valid")
+    validate_parser.set_defaults(func=validate)
+
+    search_parser = subparsers.add_parser("search", help="Search SNOMED CT concepts")
+    search_parser.add_argument("term")
+    search_parser.add_argument("--ecl", default="<< 138875005", help="ECL constraint")
+    search_parser.add_argument("--limit", type=int, default=50)
+    search_parser.add_argument("--local", action="store_true", help="Use the local RF2 index instead of Snowstorm")
+    search_parser.add_argument("--server", default=terminology.SNOWSTORM_URL, help="Snowstorm base URL")
+    search_parser.add_argument("--branch", default="MAIN")
+    search_parser.add_argument("--no-cache", action="store_true")
+    search_parser.set_defaults(func=search)
+
+    convert_parser = subparsers.add_parser("convert", help="Convert a TSV to another format")
+    convert_parser.add_argument("input")
+    convert_parser.add_argument("output")
+    convert_parser.add_argument("--format", choices=sorted(set(exporters.FORMATS.values())))
+    convert_parser.add_argument("--chunksize", type=int, default=tsv_loader.CHUNK_ROWS)
+    convert_parser.set_defaults(func=convert)
+
+    diff_parser = subparsers.add_parser("diff", help="Compare two releases keyed by a column")
+    diff_parser.add_argument("old")
+    diff_parser.add_argument("new")
+    diff_parser.add_argument("--key", required=True, help="Column identifying a row in both files, e.g. a concept id")
+    diff_parser.add_argument("--output", default="-", help="Output file, or - for stdout")
+    diff_parser.add_argument("--format", choices=sorted(set(exporters.FORMATS.values())))
+    diff_parser.add_argument("--include-unchanged", action="store_true")
+    diff_parser.add_argument("--chunksize", type=int, default=tsv_loader.CHUNK_ROWS)
+    diff_parser.set_defaults(func=diff)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    # validate writes chunk by chunk, which only the text formats support; --format is
+    # already limited to those, but an output extension like .parquet is not
+    if args.func is validate and output_format(args)[0] not in exporters.STREAMING_FORMATS:
+        parser.error(f"validate can only write {', '.join(exporters.STREAMING_FORMATS)}; "
+                     f"convert the output afterwards for {output_format(args)[0]}")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+import threading
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from scg_parser import syntax_error, canonical_key
+from lazy_modules import lazy_import
+import instrumentation
+
+# requests is loaded by the first network call rather than at startup
+requests = lazy_import('requests')
+
+ONTOSERVER_URL = "https://r4.ontoserver.csiro.au/fhir"
+SNOWSTORM_URL = "https://snowstorm.snomedtools.org/snowstorm/snomed-ct"
+SNOMED_SYSTEM = "http://snomed.info/sct"
+FHIR_HEADERS = {
+    'Accept': 'application/fhir+json',
+    'Content-Type': 'application/fhir+json'
+}
+SNOWSTORM_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+}
+DEFAULT_TIMEOUT = 30
+DEFAULT_WORKERS = 8
+DEFAULT_BATCH_SIZE = 50
+
+
+def create_session(pool_size=DEFAULT_WORKERS, retries=3, backoff=0.5):
+    # One keep-alive session shared by every request, retrying transient failures with backoff
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    session = requests.Session()
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "POST"])
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def send(session, method, url, **kwargs):
+    # Every terminology request goes through here so calls, bytes and latency can be counted
+    with instrumentation.span(f"HTTP {method}", 'network', url=url) as span:
+        response = session.request(method, url, **kwargs)
+        size = len(response.content)
+        span.annotate(status=response.status_code, bytes=size)
+    instrumentation.count('HTTP calls')
+    instrumentation.count('HTTP bytes', size)
+    response.raise_for_status()
+    return response
+
+
+def validate_code_params(code, version=None):
+    params = {
+        'url': SNOMED_SYSTEM,
+        'code': code,
+        'system': SNOMED_SYSTEM
+    }
+    if version:
+        params['version'] = version
+    return params
+
+
+@instrumentation.timed('validate_code', 'terminology')
+def validate_code(session, code, base_url=ONTOSERVER_URL, timeout=DEFAULT_TIMEOUT, cache=None, version=None):
+    url = f"{base_url}/CodeSystem/$validate-code"
+    params = validate_code_params(code, version)
+    if cache is not None:
+        cached = cache.get(url, params, version)
+        if cached is not None:
+            return cached
+
+    result = send(session, 'GET', url, params=params, headers=FHIR_HEADERS, timeout=timeout).json()
+    if cache is not None:
+        cache.put(url, params, result, version)
+    return result
+
+
+@instrumentation.timed('validate_codes_batch', 'terminology')
+def validate_codes_batch(session, codes, base_url=ONTOSERVER_URL, timeout=DEFAULT_TIMEOUT, cache=None, version=None):
+    # Sends every uncached code as one entry of a FHIR batch Bundle and returns
+    # {code: resource}; failed entries come back as their OperationOutcome
+    url = f"{base_url}/CodeSystem/$validate-code"
+    results = {}
+    missing = []
+    for code in codes:
+        cached = cache.get(url, validate_code_params(code, version), version) if cache is not None else None
+        if cached is not None:
+            results[code] = cached
+        else:
+            missing.append(code)
+    if not missing:
+        return results
+
+    bundle = {
+        'resourceType': 'Bundle',
+        'type': 'batch',
+        'entry': [
+            {'request': {'method': 'GET', 'url': f"CodeSystem/$validate-code?{urlencode(validate_code_params(code, version))}"}}
+            for code in missing
+        ]
+    }
+    response = send(session, 'POST', base_url, json=bundle, headers=FHIR_HEADERS, timeout=timeout)
+
+    # Batch responses list their entries in the same order as the request
+    entries = response.json().get('entry', [])
+    for code, entry in zip(missing, entries):
+        resource = entry.get('resource') or {}
+        status = str(entry.get('response', {}).get('status', ''))
+        if status.startswith('2') and resource.get('resourceType') == 'Parameters':
+            results[code] = resource
+            if cache is not None:
+                cache.put(url, validate_code_params(code, version), resource, version)
+        else:
+            results[code] = resource or {'resourceType': 'OperationOutcome', 'issue': [{'diagnostics': status or 'no response'}]}
+    for code in missing[len(entries):]:
+        results[code] = {'resourceType': 'OperationOutcome', 'issue': [{'diagnostics': 'missing from batch response'}]}
+    return results
+
+
+@instrumentation.timed('search_concepts', 'terminology')
+def search_concepts(session, term, ecl, base_url=SNOWSTORM_URL, branch="MAIN", offset=0, limit=50, timeout=DEFAULT_TIMEOUT, cache=None):
+    # The Snowstorm branch (e.g. MAIN/SNOMEDCT-AU) identifies the edition and version.
+    # An empty ecl searches every concept.
+    url = f"{base_url}/{branch}/concepts"
+    params = {
+        'activeFilter': 'true',
+        'term': term,
+        'includeLeafFlag': 'false',
+        'form': 'inferred',
+        'offset': offset,
+        'limit': limit
+    }
+    if ecl:
+        params['ecl'] = ecl
+    if cache is not None:
+        cached = cache.get(url, params, branch)
+        if cached is not None:
+            return cached
+
+    result = send(session, 'GET', url, params=params, headers=SNOWSTORM_HEADERS, timeout=timeout).json()
+    if cache is not None:
+        cache.put(url, params, result, branch)
+    return result
+
+
+def validation_status(parameters):
+    # Reduce a $validate-code Parameters resource to a short status for the table
+    if parameters.get('resourceType') == 'OperationOutcome':
+        issues = parameters.get('issue', [])
+        detail = "; ".join(issue.get('diagnostics') or issue.get('details', {}).get('text', '') for issue in issues)
+        return f"error: {detail}"
+    result = None
+    message = None
+    for parameter in parameters.get('parameter', []):
+        if parameter.get('name') == 'result':
+            result = parameter.get('valueBoolean')
+        elif parameter.get('name') == 'message':
+            message = parameter.get('valueString')
+    if result:
+        return "valid"
+    if message:
+        return f"invalid: {message}"
+    return "invalid"
+
+
+class ColumnValidator:
+    # Validates many codes through a bounded worker pool sharing one session.
+    # transport is 'get' for one request per code or 'batch' for one Bundle POST per batch_size codes.
+    def __init__(self, base_url=ONTOSERVER_URL, max_workers=DEFAULT_WORKERS, session=None, timeout=DEFAULT_TIMEOUT, cache=None, version=None,
+                 transport='get', batch_size=DEFAULT_BATCH_SIZE):
+        self.base_url = base_url
+        self.max_workers = max_workers
+        self.session = session or create_session(pool_size=max_workers)
+        self.timeout = timeout
+        self.cache = cache
+        self.version = version
+        self.transport = transport
+        self.batch_size = batch_size
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def validate_one(self, code):
+        if self.cancelled.is_set():
+            return None
+        try:
+            return validation_status(validate_code(self.session, code, self.base_url, self.timeout, self.cache, self.version))
+        except (requests.RequestException, ValueError) as e:
+            return f"error: {e}"
+
+    def validate_batch(self, codes):
+        if self.cancelled.is_set():
+            return {}
+        try:
+            resources = validate_codes_batch(self.session, codes, self.base_url, self.timeout, self.cache, self.version)
+        except (requests.RequestException, ValueError) as e:
+            return {code: f"error: {e}" for code in codes}
+        return {code: validation_status(resource) for code, resource in resources.items()}
+
+    def validate_chunk(self, chunk):
+        if self.transport == 'batch':
+            return self.validate_batch(chunk)
+        results = {}
+        for code in chunk:
+            status = self.validate_one(code)
+            if status is not None:
+                results[code] = status
+        return results
+
+    @instrumentation.timed('validate column', 'terminology')
+    def run(self, codes, on_progress=None):
+        total = 0
+        results = {}
+        pending = {}
+
+        # Malformed expressions are rejected locally and never reach the server. The rest are
+        # validated once per canonical form, so variants differing only in terms, spacing or
+        # refinement order share one request.
+        variants = {}
+        for code in codes:
+            total += 1
+            error = syntax_error(code)
+            if error is not None:
+                results[code] = f"invalid: {error}"
+            else:
+                variants.setdefault(canonical_key(code), []).append(code)
+        codes = list(variants)
+        size = self.batch_size if self.transport == 'batch' else 1
+
+        def collect(finished):
+            for future in finished:
+                pending.pop(future)
+                if not future.cancelled():
+                    for key, status in future.result().items():
+                        for code in variants[key]:
+                            results[code] = status
+                if on_progress:
+                    on_progress(len(results), total)
+
+        # Never queue more than a couple of requests per worker, so memory stays flat for huge columns
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for start in range(0, len(codes), size):
+                if self.cancelled.is_set():
+                    break
+                if len(pending) >= self.max_workers * 2:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                chunk = codes[start:start + size]
+                pending[executor.submit(self.validate_chunk, chunk)] = chunk
+            if self.cancelled.is_set():
+                for future in pending:
+                    future.cancel()
+            collect(list(pending))
+        return results
+
+
+def distinct_codes(series):
+    codes = series.dropna().astype(str).str.strip()
+    return [code for code in codes.unique() if code]
+
+
+def status_column(series, results):
+    return series.astype(str).str.strip().map(results).fillna("")
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import instrumentation
+
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+MEMORY_ENTRIES = 4096
+# In-memory hits are written back to the accessed column in batches of this many
+TOUCH_BATCH = 256
+
+
+def config_dir():
+    if os.name == 'nt':
+        base = os.environ.get('APPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CONFIG_HOME') or os.path.join(os.path.expanduser('~'), '.config')
+    return os.path.join(base, 'termforge')
+
+
+def default_cache_path():
+    return os.path.join(config_dir(), 'terminology_cache.sqlite')
+
+
+def open_cache(path=None, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+    # Fall back to a memory-only cache when the config dir is not writable
+    try:
+        return TerminologyCache(path, ttl, max_bytes)
+    except (OSError, sqlite3.Error):
+        return TerminologyCache(':memory:', ttl, max_bytes)
+
+
+def cache_key(endpoint, params, version=""):
+    # Parameters are stripped and sorted so equivalent requests share one entry
+    normalized = sorted((str(name), str(value).strip()) for name, value in params.items() if value is not None)
+    raw = json.dumps([endpoint, version or "", normalized], separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class TerminologyCache:
+    # Terminology responses kept in SQLite with a TTL and least-recently-used eviction,
+    # fronted by a small in-memory LRU so repeated lookups never touch the disk
+    def __init__(self, path=None, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path or default_cache_path()
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.memory = OrderedDict()
+        self.touched = {}
+        self.lock = threading.Lock()
+
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, endpoint, params, version=""):
+        key = cache_key(endpoint, params, version)
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self.memory.move_to_end(key)
+                # Eviction orders by the accessed column, so memory hits must reach SQLite too
+                self.touched[key] = now
+                if len(self.touched) >= TOUCH_BATCH:
+                    self.flush_touched()
+                self.hits += 1
+                instrumentation.count('cache hits')
+                return entry[1]
+
+            row = self.conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] >= self.ttl:
+                if row is not None:
+                    self.delete(key)
+                self.memory.pop(key, None)
+                self.misses += 1
+                instrumentation.count('cache misses')
+                return None
+
+            self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            value = json.loads(row[0])
+            self.remember(key, row[1], value)
+            self.hits += 1
+            instrumentation.count('cache hits')
+            return value
+
+    def put(self, endpoint, params, value, version=""):
+        key = cache_key(endpoint, params, version)
+        data = json.dumps(value, separators=(',', ':')).encode('utf-8')
+        now = time.time()
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                self.total_bytes -= old[0]
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), now, now)
+            )
+            self.total_bytes += len(data)
+            self.evict()
+            self.conn.commit()
+            self.remember(key, now, value)
+
+    def remember(self, key, created, value):
+        self.memory[key] = (created, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > MEMORY_ENTRIES:
+            self.memory.popitem(last=False)
+
+    def flush_touched(self):
+        if not self.touched:
+            return
+        self.conn.executemany("UPDATE responses SET accessed = ? WHERE key = ?", [(accessed, key) for key, accessed in self.touched.items()])
+        self.conn.commit()
+        self.touched.clear()
+
+    def delete(self, key):
+        row = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.conn.commit()
+            self.total_bytes -= row[0]
+
+    def evict(self):
+        # Drop the least recently used entries until the cache is back under its size limit
+        if self.total_bytes > self.max_bytes:
+            self.flush_touched()
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute("SELECT key, size FROM responses ORDER BY accessed LIMIT 64").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.memory.pop(key, None)
+                self.total_bytes -= size
+                if self.total_bytes <= self.max_bytes:
+                    break
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+            self.memory.clear()
+            self.touched.clear()
+            self.total_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'bytes': self.total_bytes}
+
+    def summary(self):
+        return f"Cache: {self.hits} hits / {self.misses} misses / {self.total_bytes / 1024:.1f} KB"
+
+    def close(self):
+        with self.lock:
+            self.flush_touched()
+            self.conn.close()
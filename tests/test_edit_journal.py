@@ -0,0 +1,92 @@
+import json
+import pandas as pd
+import edit_journal
+from edit_history import EditHistory
+
+
+def base_file(tmp_path, name):
+    path = tmp_path / name
+    path.write_text("code\tterm\nA\tone\n", encoding='utf-8')
+    return str(path)
+
+
+def test_each_file_gets_its_own_journal_and_a_second_window_is_locked_out(tmp_path):
+    first, second = base_file(tmp_path, "a.tsv"), base_file(tmp_path, "b.tsv")
+    journal_a = edit_journal.EditJournal(str(tmp_path))
+    journal_b = edit_journal.EditJournal(str(tmp_path))
+    journal_a.start(first)
+    journal_b.start(second)
+    journal_a.record({'op': 'add_column', 'name': "x"})
+    journal_b.record({'op': 'add_column', 'name': "y"})
+    assert journal_a.path != journal_b.path
+
+    # The same file in another window must not truncate the journal in use
+    again = edit_journal.EditJournal(str(tmp_path))
+    again.start(first)
+    assert not again.active
+    assert edit_journal.pending_journals(str(tmp_path)) == []
+
+    journal_a.close()
+    pending = edit_journal.pending_journals(str(tmp_path))
+    assert [(path, entries) for path, base, entries in pending] == [(journal_a.path, [{'op': 'add_column', 'name': "x"}])]
+    journal_b.close()
+
+
+def test_line_torn_inside_a_utf8_character_is_skipped(tmp_path):
+    base = base_file(tmp_path, "a.tsv")
+    journal = edit_journal.EditJournal(str(tmp_path))
+    journal.start(base)
+    journal.record({'op': 'set', 'row': 0, 'col': "term", 'value': "één"})
+    journal.close()
+    torn = json.dumps({'op': 'set', 'row': 0, 'col': "term", 'value': "ü"}, ensure_ascii=False).encode('utf-8')
+    with open(journal.path, 'ab') as f:
+        f.write(torn[:torn.index("ü".encode('utf-8')) + 1])
+
+    base_entry, entries = edit_journal.pending_journal(journal.path)
+    assert base_entry['op'] == 'base'
+    assert entries == [{'op': 'set', 'row': 0, 'col': "term", 'value': "één"}]
+
+    journal.resume(journal.path, len(entries))
+    journal.record({'op': 'add_column', 'name': "x"})
+    journal.close()
+    assert edit_journal.pending_journal(journal.path)[1][-1] == {'op': 'add_column', 'name': "x"}
+
+
+def test_replay_with_undo_and_redo_matches_the_live_session(tmp_path):
+    base = base_file(tmp_path, "a.tsv")
+    df = pd.DataFrame({"code": ["B", "A", "C"], "term": ["two", "one", "three"]})
+    original = df.copy()
+    live = df.copy()
+    history = EditHistory()
+    journal = edit_journal.EditJournal(str(tmp_path))
+    journal.start(base)
+
+    def edit(entry):
+        history.apply(live, entry)
+        journal.record(entry)
+
+    def step(op):
+        getattr(history, op)(live)
+        journal.record({'op': op})
+
+    edit({'op': 'set', 'row': 0, 'col': "term", 'value': "TWO"})
+    edit({'op': 'sort', 'col': "code", 'ascending': True})
+    edit({'op': 'add_column', 'name': "note"})
+    step('undo')
+    step('undo')
+    step('redo')
+    edit({'op': 'replace', 'columns': ["term"], 'pattern': "e", 'replacement': "E", 'regex': False, 'case': True})
+    edit({'op': 'delete_column', 'name': "code"})
+    step('undo')
+    journal.close()
+
+    _, entries = edit_journal.pending_journal(journal.path)
+    replayed_history = EditHistory()
+    replayed = edit_journal.replay(original.copy(), entries, replayed_history)
+
+    pd.testing.assert_frame_equal(replayed, live)
+    assert list(replayed.columns) == ["code", "term"]
+    assert replayed["term"].tolist() == ["onE", "TWO", "thrEE"]
+    # The histories match too, so undo after recovery keeps working
+    assert len(replayed_history.undo_stack) == len(history.undo_stack)
+    assert replayed_history.redo_stack == history.redo_stack
@@ -0,0 +1,64 @@
+import random
+import threading
+import time
+import terminology
+from benchmarks.mock_server import MockTerminologyServer
+from benchmarks.synthetic import synthetic_sctid
+from job_scheduler import JobScheduler
+
+
+class FakeRoot:
+    # Stands in for Tk: after() callbacks are run by drain() on the test thread
+    def __init__(self):
+        self.pending = []
+
+    def after(self, ms, callback):
+        self.pending.append(callback)
+
+    def drain(self, timeout=5):
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            callback = self.pending.pop(0)
+            callback()
+            time.sleep(0.01)
+
+
+def test_cancelling_a_running_job_stops_column_validation():
+    server = MockTerminologyServer(latency=0.05).start()
+    root = FakeRoot()
+    scheduler = JobScheduler(root)
+    started = threading.Event()
+    outcome = []
+    try:
+        validator = terminology.ColumnValidator(server.fhir_url, max_workers=2)
+        rng = random.Random(1)
+        codes = [synthetic_sctid(rng) for _ in range(200)]
+
+        def work(job):
+            job.add_cancel_hook(validator.cancel)
+            started.set()
+            return validator.run(codes)
+
+        job_id = scheduler.submit(work, on_done=outcome.append, on_cancel=lambda: outcome.append("cancelled"))
+        started.wait(5)
+        time.sleep(0.1)
+        start = time.monotonic()
+        scheduler.cancel(job_id)
+        root.drain()
+        assert outcome == ["cancelled"]
+        assert time.monotonic() - start < 2
+        assert server.requests < 20
+    finally:
+        scheduler.shutdown()
+        server.stop()
+
+
+def test_cancel_hook_added_after_cancel_runs_immediately():
+    scheduler = JobScheduler(FakeRoot())
+    calls = []
+    job_id = scheduler.submit(lambda job: None)
+    job = scheduler.jobs[job_id]
+    scheduler.cancel(job_id)
+    job.add_cancel_hook(lambda: calls.append(1))
+    assert calls == [1]
+    scheduler.shutdown()
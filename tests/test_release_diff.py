@@ -0,0 +1,46 @@
+import pandas as pd
+import release_diff
+import tsv_loader
+
+
+def write_tsv(path, rows):
+    path.write_text("id\tstatus\tterm\n" + "".join(f"{row[0]}\t{row[1]}\t{row[2]}\n" for row in rows))
+    return str(path)
+
+
+def test_diff_of_files_loaded_with_categorical_columns(tmp_path):
+    old = tsv_loader.load_tsv_chunked(write_tsv(tmp_path / "old.tsv", [
+        (i, "active" if i % 2 else "retired", f"term {i}") for i in range(20)
+    ]))
+    new = tsv_loader.load_tsv_chunked(write_tsv(tmp_path / "new.tsv", [
+        (i, "active" if i % 3 else "draft", f"term {i}") for i in range(5, 25)
+    ]))
+    assert isinstance(old["status"].dtype, pd.CategoricalDtype)
+    assert isinstance(new["status"].dtype, pd.CategoricalDtype)
+
+    diff, summary = release_diff.diff_frames(old, new, "id")
+
+    assert summary["added"] == 5
+    assert summary["removed"] == 5
+    changed = [i for i in range(5, 20) if ("active" if i % 2 else "retired") != ("active" if i % 3 else "draft")]
+    assert summary["changed"] == len(changed)
+    assert summary["unchanged"] == 15 - len(changed)
+    rows = diff.set_index("id")
+    assert rows.loc["6", "status"] == "draft"
+    assert rows.loc["6", "status (old)"] == "retired"
+    assert rows.loc["0", "status"] == "retired"
+    assert rows.loc["24", release_diff.STATUS_COLUMN] == "added"
+
+
+def test_int_column_in_one_file_and_float_in_the_other():
+    # A blank makes pandas read the key and the count column as float64 in the new file only
+    old = pd.DataFrame({"id": [1, 2, 3], "count": [10, 20, 30], "term": ["a", "b", "c"]})
+    new = pd.DataFrame({"id": [1.0, 2.0, 3.0, None], "count": [10.0, 21.0, 30.0, None], "term": ["a", "b", "c", "d"]})
+    diff, summary = release_diff.diff_frames(old, new, "id")
+    assert summary["added"] == 1
+    assert summary["removed"] == 0
+    assert summary["changed"] == 1
+    assert summary["unchanged"] == 2
+    changed = diff[diff[release_diff.STATUS_COLUMN] == "changed"]
+    assert changed["id"].tolist() == ["2"]
+    assert changed[release_diff.CHANGED_COLUMN].tolist() == ["count"]
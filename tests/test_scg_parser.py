@@ -0,0 +1,42 @@
+import pytest
+import scg_parser
+
+
+@pytest.mark.parametrize("text", [
+    "73211009",
+    "73211009 |Diabetes mellitus|",
+    "73211009 + 44054006",
+    "125605004 : 272741003 = 7771000, 363698007 = 71341001",
+    "71388002 : { 260686004 = 129304002, 405813007 = 66754008 }",
+])
+def test_accepts_well_formed_expressions(text):
+    assert scg_parser.syntax_error(text) is None
+    assert scg_parser.parse_expression(text) is not None
+
+
+@pytest.mark.parametrize("text, position", [
+    ("73211009 |Diabetes mellitus", 9),
+    ("73211008", 0),
+    ("73211009 :", 10),
+])
+def test_rejects_malformed_expressions_with_a_position(text, position):
+    error = scg_parser.syntax_error(text)
+    assert isinstance(error, scg_parser.SCGSyntaxError)
+    assert error.position == position
+    assert scg_parser.canonical_form(text) is None
+    with pytest.raises(scg_parser.SCGSyntaxError) as raised:
+        scg_parser.parse_expression(text)
+    assert raised.value.position == position
+    # Cached errors are raised as fresh exceptions rather than the same object
+    assert raised.value is not error
+
+
+def test_canonical_form_ignores_terms_spacing_and_order():
+    assert scg_parser.canonical_form("73211009 |Diabetes mellitus|") == "73211009"
+    assert scg_parser.canonical_form("73211009 + 44054006") == "44054006+73211009"
+    assert (scg_parser.canonical_form("125605004:363698007=71341001,272741003=7771000")
+            == scg_parser.canonical_form("125605004 : 272741003 = 7771000, 363698007 = 71341001")
+            == "125605004:272741003=7771000,363698007=71341001")
+    assert scg_parser.canonical_form("71388002 : { 260686004 = 129304002, 405813007 = 66754008 }") == "71388002:{260686004=129304002,405813007=66754008}"
+    assert scg_parser.canonical_key("73211009 |x") == "73211009 |x"
+    assert scg_parser.expression_hash("73211009") == scg_parser.expression_hash(" 73211009 |Diabetes mellitus| ")
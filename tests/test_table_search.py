@@ -0,0 +1,42 @@
+import pandas as pd
+import table_search
+from edit_history import EditHistory
+
+
+def test_replace_leaves_non_text_cells_and_undo_restores_them():
+    df = pd.DataFrame({
+        "code": pd.Series([100 + i if i % 2 else f"A{i}" for i in range(10)], dtype=object),
+        "term": pd.Series([f"A term {i}" for i in range(10)]),
+    })
+    original = df.copy()
+    history = EditHistory()
+
+    old_columns, rows = history.apply(df, {
+        'op': 'replace', 'columns': ["code", "term"], 'pattern': "A", 'replacement': "B", 'regex': False, 'case': True
+    })
+
+    assert df["code"].tolist() == [100 + i if i % 2 else f"B{i}" for i in range(10)]
+    assert df["term"].iloc[3] == "B term 3"
+    assert list(rows) == list(range(10))
+    history.undo(df)
+    assert df.equals(original)
+
+
+def test_replace_reports_only_rows_that_changed():
+    df = pd.DataFrame({"code": pd.Series(["A1", 5, "C3", None], dtype=object)})
+    _, rows = table_search.replace_in_columns(df, ["code"], "A|C", "A", regex=True)
+    assert list(rows) == [2]
+    assert df["code"].tolist()[:3] == ["A1", 5, "A3"]
+    assert pd.isna(df["code"].iloc[3])
+
+
+def test_match_counts_ignore_case_on_str_categorical_and_object_columns():
+    df = pd.DataFrame({
+        "text": pd.Series(["abc ABC", "aBc", "z", None]),
+        "status": pd.Categorical(["ABC", "abc", "aBc", "z"]),
+        "mixed": pd.Series(["ABC", 7, None, "xyz"], dtype=object),
+        "numbers": pd.Series([1, 2, 3, 4], dtype=object),
+    })
+    counts = table_search.match_counts(df, list(df.columns), "abc", case=False)
+    assert counts == {"text": (2, 3), "status": (3, 3), "mixed": (1, 1), "numbers": (0, 0)}
+    assert table_search.match_counts(df, ["text", "status"], "abc")["status"] == (1, 1)
@@ -0,0 +1,29 @@
+import random
+import terminology
+from benchmarks.mock_server import MockTerminologyServer
+from benchmarks.synthetic import synthetic_sctid
+
+
+def test_batch_transport_gives_the_same_statuses_in_fewer_requests():
+    rng = random.Random(7)
+    codes = [synthetic_sctid(rng) for _ in range(120)]
+    codes += [f"{codes[0]} : 363698007 = {codes[1]}", "73211009 |Diabetes mellitus", "123456"]
+    server = MockTerminologyServer().start()
+    try:
+        requests_made = {}
+        statuses = {}
+        for transport in ("get", "batch"):
+            before = server.requests
+            validator = terminology.ColumnValidator(server.fhir_url, max_workers=4, transport=transport, batch_size=50)
+            statuses[transport] = validator.run(codes)
+            requests_made[transport] = server.requests - before
+    finally:
+        server.stop()
+
+    assert statuses["batch"] == statuses["get"]
+    assert set(statuses["get"]) == set(codes)
+    assert len(set(statuses["get"].values())) > 1
+    # Malformed expressions are answered locally, so each transport sends at most one request per code or per batch
+    assert requests_made["get"] <= len(codes)
+    assert requests_made["batch"] <= -(-len(codes) // 50)
+    assert requests_made["batch"] < requests_made["get"]
@@ -0,0 +1,18 @@
+import time
+from terminology_cache import TerminologyCache
+
+
+def test_entries_hit_from_memory_are_evicted_last(tmp_path):
+    cache = TerminologyCache(str(tmp_path / "cache.sqlite"), max_bytes=10 ** 6)
+    for n in range(5):
+        cache.put("url", {'code': n}, {'n': n})
+        time.sleep(0.01)
+    for _ in range(100):
+        assert cache.get("url", {'code': 0}) == {'n': 0}
+
+    cache.max_bytes = cache.total_bytes - 1
+    cache.put("url", {'code': 5}, {'n': 5})
+
+    assert cache.get("url", {'code': 0}) == {'n': 0}
+    assert cache.get("url", {'code': 1}) is None
+    cache.close()
@@ -0,0 +1,15 @@
+import edit_journal
+import tsv_loader
+
+
+def test_column_that_changes_type_between_chunks_stays_text(tmp_path):
+    path = tmp_path / "codes.tsv"
+    path.write_text("code\tcount\n" + "".join(f"{100000 + i if i < 50 else f'X{i}'}\t{i}\n" for i in range(80)))
+
+    df = tsv_loader.load_tsv_chunked(str(path), chunksize=30)
+
+    assert {type(value) for value in df["code"]} == {str}
+    assert df["code"].iloc[0] == "100000"
+    assert df["count"].dtype.kind == "i"
+    edit_journal.apply_entry(df, {'op': 'sort', 'col': 'code', 'ascending': False})
+    assert df["code"].iloc[0] == "X79"
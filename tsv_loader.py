@@ -0,0 +1,126 @@
+import os
+import pandas as pd
+from pandas.api.types import union_categoricals
+import instrumentation
+
+try:
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa_csv = None
+
+CHUNK_ROWS = 50000
+# Text columns whose distinct values are at most this share of the rows are stored as categoricals
+CATEGORY_RATIO = 0.5
+
+
+def is_text_column(series):
+    return series.dtype == object or pd.api.types.is_string_dtype(series.dtype)
+
+
+def is_category_column(series):
+    return isinstance(series.dtype, pd.CategoricalDtype)
+
+
+def category_candidates(chunk):
+    rows = max(len(chunk), 1)
+    return [col for col in chunk.columns if is_text_column(chunk[col]) and chunk[col].nunique() / rows <= CATEGORY_RATIO]
+
+
+def compact_chunk(chunk, category_columns):
+    # Repeated strings such as 'id | term |' references and status flags become categoricals,
+    # so each distinct string is stored once and rows only hold small integer codes
+    for col in category_columns:
+        series = chunk[col]
+        if not is_text_column(series):
+            series = series.where(series.isna(), series.astype(str))
+        chunk[col] = series.astype('category')
+    return chunk
+
+
+def as_text(series):
+    # Whole numbers read as floats (a chunk with blanks) keep their integer spelling
+    if pd.api.types.is_float_dtype(series.dtype):
+        present = series.dropna()
+        if (present == present.round()).all():
+            series = series.astype('Int64')
+    return series.astype(str).astype(object).where(series.notna())
+
+
+def concat_chunks(chunks, category_columns):
+    if len(chunks) == 1:
+        return chunks[0]
+    data = {}
+    for col in chunks[0].columns:
+        parts = [chunk[col] for chunk in chunks]
+        if col in category_columns:
+            data[col] = pd.Series(union_categoricals([part.values for part in parts], sort_categories=True))
+        elif any(is_text_column(part) for part in parts) and not all(is_text_column(part) for part in parts):
+            # Each chunk guesses its own dtypes, so a code column can be numeric in one chunk
+            # and text in the next; keep it all text like a single read of the file would
+            text_dtype = next(part.dtype for part in parts if is_text_column(part))
+            data[col] = pd.concat([part if is_text_column(part) else as_text(part) for part in parts], ignore_index=True).astype(text_dtype)
+        else:
+            data[col] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(data)
+
+
+def read_chunks(f, engine, chunksize):
+    if engine == 'pyarrow' and pa_csv is not None:
+        reader = pa_csv.open_csv(
+            f,
+            read_options=pa_csv.ReadOptions(block_size=8 * 1024 * 1024),
+            parse_options=pa_csv.ParseOptions(delimiter='\t')
+        )
+        for batch in reader:
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(f, delimiter='\t', chunksize=chunksize)
+
+
+@instrumentation.timed('load_tsv', 'io')
+def load_tsv_chunked(file_path, on_first_chunk=None, on_progress=None, chunksize=CHUNK_ROWS, engine='pandas', cancelled=None):
+    # Reads a TSV in chunks, compacting each one as it arrives. The first chunk is
+    # handed to on_first_chunk so it can be shown while the rest loads; on_progress
+    # gets the fraction of the file read. Returns None if cancelled.
+    total_bytes = max(os.path.getsize(file_path), 1)
+    chunks = []
+    category_columns = None
+    with open(file_path, 'rb') as f:
+        for chunk in read_chunks(f, engine, chunksize):
+            if cancelled is not None and cancelled.is_set():
+                return None
+            if category_columns is None:
+                category_columns = category_candidates(chunk)
+            chunks.append(compact_chunk(chunk, category_columns))
+            if len(chunks) == 1 and on_first_chunk:
+                on_first_chunk(chunks[0].copy())
+            if on_progress:
+                on_progress(min(f.tell() / total_bytes, 1.0))
+
+    if not chunks:
+        return pd.read_csv(file_path, delimiter='\t')
+    return concat_chunks(chunks, category_columns)
+
+
+def set_cell(df, row, col, value):
+    # Categorical columns only accept known categories, so new values are added first
+    series = df.iloc[:, col]
+    if is_category_column(series) and not pd.isna(value) and value not in series.cat.categories:
+        df.isetitem(col, series.cat.add_categories([value]))
+    df.iat[row, col] = value
+
+
+def set_cells(df, rows, col, values):
+    series = df.iloc[:, col]
+    if is_category_column(series):
+        missing = pd.Index(values).dropna().unique().difference(series.cat.categories)
+        if len(missing):
+            df.isetitem(col, series.cat.add_categories(missing))
+    df.iloc[rows, col] = values
+
+
+def sort_key(series):
+    # Categoricals sort by category order, which edits can leave unsorted; sort by value instead
+    if is_category_column(series):
+        return series.astype(object)
+    return series
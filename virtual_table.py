@@ -0,0 +1,214 @@
+from bisect import bisect_left
+from tkinter import ttk
+
+# Number of extra rows kept below the viewport so small resizes don't need a refill
+DEFAULT_BUFFER_ROWS = 10
+DEFAULT_ROW_HEIGHT = 20
+HEADING_HEIGHT = 25
+
+
+class VirtualTable:
+    # Shows a DataFrame in a Treeview by keeping a fixed pool of items for the
+    # rows on screen and refilling their values from the DataFrame on scroll.
+    def __init__(self, tree, scroll_y, buffer_rows=DEFAULT_BUFFER_ROWS):
+        self.tree = tree
+        self.scroll_y = scroll_y
+        self.buffer_rows = buffer_rows
+        self.enabled = True
+        self.df = None
+        self.columns = []
+        self.first_row = 0
+        self.visible_rows = 40
+        self.selected_row = None
+
+        self.tree.bind("<Configure>", self.on_configure)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda event: self.on_scroll_units(-3))
+        self.tree.bind("<Button-5>", lambda event: self.on_scroll_units(3))
+        self.tree.bind("<Up>", lambda event: self.move_selection(-1))
+        self.tree.bind("<Down>", lambda event: self.move_selection(1))
+        self.tree.bind("<Prior>", lambda event: self.move_selection(-self.visible_rows))
+        self.tree.bind("<Next>", lambda event: self.move_selection(self.visible_rows))
+
+    def row_count(self):
+        return len(self.df) if self.df is not None else 0
+
+    def window_size(self):
+        if not self.enabled:
+            return self.row_count()
+        return self.visible_rows + self.buffer_rows
+
+    def row_height(self):
+        height = ttk.Style().lookup("Treeview", "rowheight")
+        try:
+            return int(height) or DEFAULT_ROW_HEIGHT
+        except (TypeError, ValueError):
+            return DEFAULT_ROW_HEIGHT
+
+    def load(self, df, columns):
+        self.df = df
+        self.columns = list(columns)
+        if self.enabled:
+            self.scroll_y.configure(command=self.yview)
+            self.tree.configure(yscrollcommand=lambda first, last: None)
+        else:
+            self.scroll_y.configure(command=self.tree.yview)
+            self.tree.configure(yscrollcommand=self.scroll_y.set)
+        self.tree.delete(*self.tree.get_children())
+        self.scroll_to(self.first_row, force=True)
+
+    def refresh(self):
+        if self.df is None:
+            return
+        stop = min(self.first_row + self.window_size(), self.row_count())
+        block = self.df.iloc[self.first_row:stop][self.columns]
+        children = self.tree.get_children()
+        needed = stop - self.first_row
+
+        # Reuse the existing items and only create or drop the difference.
+        # Outside virtual mode every row has its own item, keyed by index label
+        # so sorts can move items instead of rewriting them.
+        for slot, values in enumerate(block.itertuples(index=False, name=None)):
+            if slot < len(children):
+                self.tree.item(children[slot], values=values)
+            elif self.enabled:
+                self.tree.insert("", "end", values=values)
+            else:
+                label = self.df.index[self.first_row + slot]
+                self.tree.insert("", "end", iid=str(label), values=values)
+        if len(children) > needed:
+            self.tree.delete(*children[needed:])
+
+        self.sync_selection()
+        if self.enabled:
+            self.tree.yview_moveto(0)
+            self.update_scrollbar()
+
+    def update_scrollbar(self):
+        total = self.row_count()
+        if total == 0:
+            self.scroll_y.set(0, 1)
+            return
+        last = min(self.first_row + self.visible_rows, total)
+        self.scroll_y.set(self.first_row / total, last / total)
+
+    def scroll_to(self, first, force=False):
+        if self.enabled:
+            first = max(0, min(first, self.row_count() - self.visible_rows))
+        else:
+            first = 0
+        if force or first != self.first_row:
+            self.first_row = first
+            self.refresh()
+
+    def yview(self, *args):
+        if not args or self.df is None:
+            return
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * self.row_count()))
+        elif args[0] == "scroll":
+            step = int(args[1])
+            if args[2] == "pages":
+                step *= self.visible_rows
+            self.scroll_to(self.first_row + step)
+
+    def on_configure(self, event):
+        rows = max(1, (event.height - HEADING_HEIGHT) // self.row_height())
+        if rows != self.visible_rows:
+            self.visible_rows = rows
+            if self.enabled:
+                self.scroll_to(self.first_row, force=True)
+
+    def on_mousewheel(self, event):
+        if not self.enabled:
+            return None
+        return self.on_scroll_units(-3 if event.delta > 0 else 3)
+
+    def on_scroll_units(self, units):
+        if not self.enabled:
+            return None
+        self.scroll_to(self.first_row + units)
+        return "break"
+
+    def move_selection(self, step):
+        if not self.enabled or self.selected_row is None:
+            return None
+        row = max(0, min(self.selected_row + step, self.row_count() - 1))
+        self.selected_row = row
+        if row < self.first_row:
+            self.scroll_to(row)
+        elif row >= self.first_row + self.visible_rows:
+            self.scroll_to(row - self.visible_rows + 1)
+        self.sync_selection()
+        return "break"
+
+    # Change notifications from the editor; each one patches only what changed
+    def row_values(self, row):
+        return tuple(self.df.iloc[row][self.columns])
+
+    def row_changed(self, row):
+        item = self.item_for_row(row)
+        if item is not None:
+            self.tree.item(item, values=self.row_values(row))
+
+    def rows_changed(self, rows):
+        # rows must be sorted; in virtual mode only those inside the window have items to patch
+        if self.enabled:
+            start = bisect_left(rows, self.first_row)
+            stop = bisect_left(rows, self.first_row + self.window_size())
+            rows = rows[start:stop]
+        for row in rows:
+            self.row_changed(int(row))
+
+    def rows_reordered(self):
+        if self.enabled:
+            self.refresh()
+            return
+        for position, label in enumerate(self.df.index):
+            self.tree.move(str(label), "", position)
+        self.sync_selection()
+
+    def column_appended(self, col):
+        # Items have no value for a new trailing column, which Tk shows as empty
+        self.columns.append(col)
+
+    def columns_changed(self, columns):
+        self.columns = list(columns)
+        self.refresh()
+
+    # Map between Treeview items and positions in the DataFrame
+    def row_at(self, item):
+        return self.first_row + self.tree.index(item)
+
+    def item_for_row(self, row):
+        if row is None or not 0 <= row < self.row_count():
+            return None
+        if not self.enabled:
+            item = str(self.df.index[row])
+            return item if self.tree.exists(item) else None
+        slot = row - self.first_row
+        children = self.tree.get_children()
+        if 0 <= slot < len(children):
+            return children[slot]
+        return None
+
+    def select_row(self, row):
+        self.selected_row = row
+        self.sync_selection()
+
+    def show_row(self, row):
+        # Scrolls row into view and selects it
+        if self.enabled and not self.first_row <= row < self.first_row + self.visible_rows:
+            self.scroll_to(row - self.visible_rows // 2)
+        self.select_row(row)
+        item = self.item_for_row(row)
+        if item is not None:
+            self.tree.see(item)
+
+    def sync_selection(self):
+        item = self.item_for_row(self.selected_row)
+        if item is None:
+            self.tree.selection_set(())
+        else:
+            self.tree.selection_set(item)
+            self.tree.focus(item)